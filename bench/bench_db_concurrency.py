@@ -0,0 +1,109 @@
+# Charge mixte lecture/écriture sur la même base SQLite depuis plusieurs
+# process (comme les workers gunicorn), pour comparer :
+#   - delete : journal_mode=DELETE, synchronous=FULL (réglages SQLite par défaut)
+#   - wal    : journal_mode=WAL, synchronous=NORMAL (database.py)
+#
+#   python bench/bench_db_concurrency.py [workers] [secondes] [part d'écritures]
+import datetime
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import percentile
+
+MODES = {
+    "delete": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL"},
+    "wal": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL"},
+}
+EXOS = 10
+PR_TYPES = ["1rep max", "2reps max", "max reps", "7s max"]
+SEED_RECORDS = 2000
+
+
+def seed(url):
+    from sqlalchemy import create_engine, insert
+    from main import db, User, Exo, Personal_record
+    from werkzeug.security import generate_password_hash
+
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    rng = random.Random(0)
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [{"id": 1, "name": "bench", "email": "bench@example.com",
+                                               "password": generate_password_hash("bench"), "data_version": 0}])
+        conn.execute(insert(Exo.__table__), [{"id": i, "name": f"Exo {i}"} for i in range(1, EXOS + 1)])
+        conn.execute(insert(Personal_record.__table__), [{
+            "pr": rng.choice(PR_TYPES), "quantity": rng.randint(1, 20), "added_weight": rng.randint(0, 60),
+            "date": datetime.date(2020, 1, 1) + datetime.timedelta(days=rng.randint(0, 1500)),
+            "exo_id": rng.randint(1, EXOS), "user_id": 1, "weight": 75,
+        } for _ in range(SEED_RECORDS)])
+    engine.dispose()
+
+
+def worker(args):
+    url, mode, seconds, write_ratio, seed_value = args
+    os.environ["DATABASE_URL"] = url
+    os.environ.update(MODES[mode])
+    import main
+
+    client = main.app.test_client()
+    headers = {"Authorization": "Bearer " + main.generate_token(1)}
+    rng = random.Random(seed_value)
+    results = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        write = rng.random() < write_ratio
+        exo_id = rng.randint(1, EXOS)
+        start = time.perf_counter()
+        if write:
+            response = client.post("/personal-record", headers=headers, json={
+                "exo_id": exo_id, "pr": rng.choice(PR_TYPES), "quantity": rng.randint(1, 20), "time": None,
+                "added_weight": rng.randint(0, 60), "date": "2025-06-01", "weight": 75,
+            })
+        else:
+            path = rng.choice([
+                "/pr-types",
+                "/personal-records/best",
+                f"/get-personal-record/{rng.choice(PR_TYPES)}/{exo_id}",
+            ])
+            response = client.get(path, headers=headers)
+        results.append((write, time.perf_counter() - start, response.status_code))
+    return results
+
+
+def run(mode, workers, seconds, write_ratio):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        seed(url)
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(workers) as pool:
+            per_worker = pool.map(worker, [(url, mode, seconds, write_ratio, i) for i in range(workers)])
+
+    results = [r for rs in per_worker for r in rs]
+    reads = [t for write, t, status in results if not write and status < 500]
+    writes = [t for write, t, status in results if write and status < 500]
+    errors = sum(1 for _, _, status in results if status >= 500)
+    # Débit sur la durée de charge (hors démarrage des workers)
+    print(f"{mode:<7} {len(results) / seconds:8.0f} req/s  "
+          f"lecture p50 {percentile(reads, 0.5):6.1f} ms p99 {percentile(reads, 0.99):7.1f} ms  "
+          f"écriture p50 {percentile(writes, 0.5):6.1f} ms p99 {percentile(writes, 0.99):7.1f} ms  "
+          f"erreurs {errors}")
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    write_ratio = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+    print(f"{workers} process, {seconds:.0f} s, {write_ratio:.0%} d'écritures")
+    for mode in MODES:
+        run(mode, workers, seconds, write_ratio)
+
+
+if __name__ == "__main__":
+    main()
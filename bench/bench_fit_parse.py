@@ -0,0 +1,146 @@
+# Débit du lecteur FIT incrémental sur les fichiers d'exemple, et pic mémoire
+# quand on lui donne un flux de plus en plus gros (fichiers FIT chaînés) : pour
+# le lecteur seul, puis pour POST /activities/fit de bout en bout (analyse
+# cardio et écriture en base comprises).
+#
+#   python bench/bench_fit_parse.py
+import math
+import os
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+
+from fit_reader import iter_hr_records
+from hr_stream import StreamEncoder
+
+FILES = ["exemple.fit", "exemple_climbing.fit"]
+
+
+class RepeatedStream:
+    # Flux qui enchaîne le même fichier FIT n fois, sans jamais tout charger
+    def __init__(self, path, times):
+        self.path = path
+        self.remaining = times
+        self.current = None
+
+    def read(self, n=-1):
+        while self.remaining:
+            if self.current is None:
+                self.current = open(self.path, "rb")
+            chunk = self.current.read(n)
+            if chunk:
+                return chunk
+            self.current.close()
+            self.current = None
+            self.remaining -= 1
+        return b""
+
+
+class SyntheticFit:
+    # Un seul fichier FIT de n records cardio à 1 Hz, produit au fil de la
+    # lecture : timestamps croissants (l'upload ne jette rien), taille arbitraire
+    DEFINITION = bytes([0x40, 0, 0]) + struct.pack("<HB", 20, 2) + bytes([253, 4, 0x86, 3, 1, 0x02])
+
+    def __init__(self, samples, batch=1000):
+        self.samples = samples
+        self.batch = batch
+        self.buffer = b""
+        self.chunks = self._chunks()
+
+    def _chunks(self):
+        data_size = len(self.DEFINITION) + 6 * self.samples
+        yield bytes([12, 0x10]) + struct.pack("<HI", 2100, data_size) + b".FIT" + self.DEFINITION
+        record = struct.Struct("<BIB")
+        for start in range(0, self.samples, self.batch):
+            yield b"".join(record.pack(0, 1_000_000_000 + i, 120 + int(40 * math.sin(i / 300)))
+                           for i in range(start, min(start + self.batch, self.samples)))
+        yield b"\x00\x00"  # CRC, non vérifié
+
+    def read(self, n=-1):
+        while n < 0 or len(self.buffer) < n:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        data, self.buffer = (self.buffer, b"") if n < 0 else (self.buffer[:n], self.buffer[n:])
+        return data
+
+
+def throughput(path, repeat=5):
+    size = os.path.getsize(path)
+    best = None
+    for _ in range(repeat):
+        with open(path, "rb") as f:
+            start = time.perf_counter()
+            count = sum(1 for _ in iter_hr_records(f))
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{os.path.basename(path):<22} {size / 1024:7.0f} Ko  {count:6} records  "
+          f"{best * 1000:7.1f} ms  {count / best:10,.0f} records/s  {size / best / 2**20:6.1f} Mo/s")
+
+
+def peak_memory(path, times):
+    # Même chemin que l'upload : lecture incrémentale + encodage par lots
+    tracemalloc.start()
+    encoder = StreamEncoder()
+    hr_batch, time_batch = [], []
+    for timestamp, hr in iter_hr_records(RepeatedStream(path, times)):
+        hr_batch.append(hr)
+        time_batch.append(timestamp)
+        if len(hr_batch) >= 1000:
+            encoder.extend(hr_batch, time_batch)
+            hr_batch, time_batch = [], []
+    encoder.extend(hr_batch, time_batch)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = os.path.getsize(path) * times
+    print(f"x{times:<3} {size / 2**20:7.1f} Mo lus  {encoder.count:8} samples  pic mémoire {peak / 1024:7.0f} Ko")
+
+
+def endpoint_memory(client, headers, samples):
+    # La requête complète, corps lu au fil de l'eau comme sous gunicorn
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.post("/activities/fit", headers=headers, content_type="application/octet-stream",
+                           environ_overrides={"wsgi.input": SyntheticFit(samples), "wsgi.input_terminated": True})
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = 12 + len(SyntheticFit.DEFINITION) + 6 * samples + 2
+    print(f"upload {size / 2**20:7.1f} Mo  {response.get_json().get('samples'):8} samples  {elapsed * 1000:7.0f} ms  "
+          f"pic mémoire {peak / 1024:7.0f} Ko  (HTTP {response.status_code})")
+
+
+def main():
+    for name in FILES:
+        throughput(os.path.join(ROOT, name))
+    print()
+    for times in (1, 10, 50):
+        peak_memory(os.path.join(ROOT, FILES[0]), times)
+
+    print()
+    with tempfile.TemporaryDirectory() as tmp:
+        # main lit sa configuration à l'import
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        import main as app_module
+        with app_module.app.app_context():
+            app_module.db.create_all()
+            user = app_module.User(name="bench", email="bench@example.com")
+            user.set_password("bench")
+            app_module.db.session.add(user)
+            app_module.db.session.commit()
+            headers = {"Authorization": "Bearer " + app_module.generate_token(user.id)}
+        client = app_module.app.test_client()
+        for samples in (10_000, 100_000, 1_000_000):
+            endpoint_memory(client, headers, samples)
+        with app_module.app.app_context():
+            app_module.db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
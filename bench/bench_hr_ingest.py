@@ -0,0 +1,141 @@
+# Benchmark écriture / lecture d'un stream cardio de 10k samples :
+#   - orm    : un objet HeartRateSample + session.add par sample, dans
+#              l'ancienne table heart_rate_sample (chemin d'origine)
+#   - rows   : même table, un seul executemany
+#   - packed : une ligne heart_rate_stream par activité (hr_stream.py)
+#
+#   python bench/bench_hr_ingest.py [nb_samples]
+import os
+import sys
+import tempfile
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import Column, ForeignKey, Integer, Table, create_engine, insert, select
+from sqlalchemy.orm import Session, registry
+
+from main import db, User, StravaActivity, HeartRateStream
+from hr_stream import pack_stream
+
+# Ancienne table "une ligne par sample", gardée ici uniquement pour comparer
+heart_rate_sample = Table(
+    "heart_rate_sample", db.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("activity_id", Integer, ForeignKey("strava_activity.id"), nullable=False),
+    Column("hr", Integer, nullable=False),
+    Column("time", Integer, nullable=False),
+)
+
+
+class HeartRateSample:
+    # Modèle minimal sur cette table, pour mesurer le chemin ORM d'origine
+    def __init__(self, activity_id, hr, time):
+        self.activity_id = activity_id
+        self.hr = hr
+        self.time = time
+
+
+registry().map_imperatively(HeartRateSample, heart_rate_sample)
+
+
+def make_stream(n):
+    hr = [random.randint(90, 185) for _ in range(n)]
+    t = list(range(n))
+    return hr, t
+
+
+def new_activity(session, strava_id):
+    act = StravaActivity(strava_id=strava_id, user_id=1)
+    session.add(act)
+    session.flush()
+    return act.id
+
+
+def ingest_orm(engine, hr, t, strava_id):
+    with Session(engine) as session:
+        activity_id = new_activity(session, strava_id)
+        for h, s in zip(hr, t):
+            session.add(HeartRateSample(activity_id=activity_id, hr=h, time=s))
+        session.commit()
+    return activity_id
+
+
+def ingest_rows(engine, hr, t, strava_id):
+    with Session(engine) as session:
+        activity_id = new_activity(session, strava_id)
+        session.execute(insert(heart_rate_sample), [
+            {"activity_id": activity_id, "hr": h, "time": s}
+            for h, s in zip(hr, t)
+        ])
+        session.commit()
+    return activity_id
+
+
+def ingest_packed(engine, hr, t, strava_id):
+    with Session(engine) as session:
+        activity_id = new_activity(session, strava_id)
+        session.add(HeartRateStream(activity_id=activity_id, sample_count=len(hr), data=pack_stream(hr, t)))
+        session.commit()
+    return activity_id
+
+
+def read_rows(engine, activity_id):
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(heart_rate_sample.c.hr, heart_rate_sample.c.time)
+            .where(heart_rate_sample.c.activity_id == activity_id)
+            .order_by(heart_rate_sample.c.time)
+        ).all()
+    return [r[0] for r in rows], [r[1] for r in rows]
+
+
+def read_packed(engine, activity_id):
+    with Session(engine) as session:
+        stream = session.execute(
+            select(HeartRateStream).where(HeartRateStream.activity_id == activity_id)
+        ).scalar_one()
+        return stream.arrays()
+
+
+def best_of(fn, repeat=3):
+    best = None
+    result = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = fn(i)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    hr, t = make_stream(n)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        db.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(User(id=1, name="bench", email="bench@example.com", password="x"))
+            session.commit()
+
+        print(f"{'mode':<7} {'écriture':>10} {'rows/s':>12} {'lecture':>10}")
+        for offset, (name, ingest, read) in enumerate((
+            ("orm", ingest_orm, read_rows),
+            ("rows", ingest_rows, read_rows),
+            ("packed", ingest_packed, read_packed),
+        )):
+            write_s, activity_id = best_of(lambda i: ingest(engine, hr, t, strava_id=offset * 10 + i))
+            read_s, (hr_back, _) = best_of(lambda i: read(engine, activity_id))
+            assert list(hr_back) == hr
+            print(f"{name:<7} {write_s * 1000:8.1f}ms {n / write_s:12,.0f} {read_s * 1000:8.2f}ms")
+
+        blob = pack_stream(hr, t)
+        print(f"packed : {len(blob)} octets pour {n} samples ({len(blob) / n:.2f} o/sample)")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
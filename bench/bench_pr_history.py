@@ -0,0 +1,123 @@
+# Latence de l'historique d'un PR (/get-personal-record) quand un utilisateur
+# accumule 1k, 10k puis 100k PR :
+#   - legacy : colonnes texte, sans index, filtre sur Exo.name via la jointure
+#   - typed  : date/time typés, index (user_id, exo_id, pr, date), filtre par exo_id
+#
+#   python bench/bench_pr_history.py
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import (Column, Float, ForeignKey, Integer, MetaData, String, Table,
+                        create_engine, insert, select)
+
+from main import db, Exo, Personal_record
+
+EXOS = 20
+PR_TYPES = ["1rep max", "2reps max", "5reps max", "max reps", "7s max"]
+
+# Ancien schéma, uniquement pour la comparaison
+legacy_metadata = MetaData()
+legacy_exo = Table("exo", legacy_metadata,
+                   Column("id", Integer, primary_key=True),
+                   Column("name", String(100), nullable=False))
+legacy_pr = Table("personal_record", legacy_metadata,
+                  Column("id", Integer, primary_key=True),
+                  Column("pr", String(100)),
+                  Column("quantity", Integer),
+                  Column("time", String(100)),
+                  Column("added_weight", Float),
+                  Column("date", String(100)),
+                  Column("exo_id", Integer, ForeignKey("exo.id"), nullable=False),
+                  Column("user_id", Integer, nullable=False),
+                  Column("weight", Integer),
+                  Column("bodyweight", Float))
+
+
+def make_rows(n, user_id, start_id):
+    rng = random.Random(n + user_id)
+    first_day = datetime.date(2015, 1, 1)
+    for i in range(n):
+        yield {
+            "id": start_id + i,
+            "pr": rng.choice(PR_TYPES),
+            "quantity": rng.randint(1, 20),
+            "added_weight": rng.randint(0, 60) + 0.5,
+            "date": first_day + datetime.timedelta(days=rng.randint(0, 3650)),
+            "exo_id": rng.randint(1, EXOS),
+            "user_id": user_id,
+            "weight": rng.randint(60, 90),
+            "bodyweight": None,
+        }
+
+
+def fill(engine, pr_table, exo_table, n, legacy):
+    with engine.begin() as conn:
+        conn.execute(insert(exo_table), [{"id": i, "name": f"Exo {i}"} for i in range(1, EXOS + 1)])
+        next_id = 1
+        # L'utilisateur mesuré + 4 autres utilisateurs du même volume
+        for user_id in range(1, 6):
+            rows = list(make_rows(n, user_id, next_id))
+            next_id += n
+            if legacy:
+                for row in rows:
+                    row["date"] = row["date"].isoformat()
+            conn.execute(insert(pr_table), rows)
+
+
+def query_legacy(conn):
+    return conn.execute(
+        select(legacy_pr)
+        .join(legacy_exo)
+        .where(legacy_pr.c.user_id == 1, legacy_pr.c.pr == "1rep max", legacy_exo.c.name == "Exo 7")
+        .order_by(legacy_pr.c.date.asc())
+    ).all()
+
+
+def query_typed(conn):
+    table = Personal_record.__table__
+    return conn.execute(
+        select(table)
+        .where(table.c.user_id == 1, table.c.exo_id == 7, table.c.pr == "1rep max")
+        .order_by(table.c.date.asc(), table.c.id.asc())
+    ).all()
+
+
+def measure(engine, fn, repeat=50):
+    timings = []
+    with engine.connect() as conn:
+        rows = fn(conn)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn(conn)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return len(rows), timings[len(timings) // 2] * 1000
+
+
+def main():
+    print(f"{'PR/user':>8} {'lignes':>7} {'legacy':>10} {'typed':>10}")
+    for n in (1_000, 10_000, 100_000):
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy_engine = create_engine(f"sqlite:///{os.path.join(tmp, 'legacy.db')}")
+            legacy_metadata.create_all(legacy_engine)
+            fill(legacy_engine, legacy_pr, legacy_exo, n, legacy=True)
+
+            typed_engine = create_engine(f"sqlite:///{os.path.join(tmp, 'typed.db')}")
+            db.metadata.create_all(typed_engine, tables=[Exo.__table__, Personal_record.__table__])
+            fill(typed_engine, Personal_record.__table__, Exo.__table__, n, legacy=False)
+
+            count, legacy_ms = measure(legacy_engine, query_legacy)
+            _, typed_ms = measure(typed_engine, query_typed)
+            print(f"{n:>8} {count:>7} {legacy_ms:8.2f}ms {typed_ms:8.2f}ms")
+            legacy_engine.dispose()
+            typed_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Temps de téléchargement des streams de 50 activités contre le stub Strava :
+# boucle séquentielle de requests.get (ancien chemin) contre StravaClient
+# (session poolée + pool de threads).
+#
+#   python bench/bench_strava_sync.py [nb_activites] [latence_s]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import requests
+
+from stub_strava import start_stub
+
+
+def sync_sequential(base_url, ids):
+    headers = {"Authorization": "Bearer bench"}
+    requests.get(f"{base_url}/api/v3/athlete/activities", headers=headers, params={"per_page": 200, "page": 1})
+    for activity_id in ids:
+        response = requests.get(
+            f"{base_url}/api/v3/activities/{activity_id}/streams",
+            headers=headers, params={"keys": "heart_rate,time", "key_by_type": "true"}
+        )
+        response.json()
+
+
+def sync_concurrent(client, ids):
+    client.get("/athlete/activities", {"per_page": 200, "page": 1})
+    for _activity_id, stream in client.fetch_streams(ids):
+        assert stream is not None
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+
+    server, base_url = start_stub(activities=n, latency=latency, stream_len=3600)
+    os.environ["STRAVA_BASE_URL"] = base_url
+    from strava_client import StravaClient
+
+    ids = [a["id"] for a in server.state.activities]
+
+    start = time.perf_counter()
+    sync_sequential(base_url, ids)
+    sequential = time.perf_counter() - start
+    print(f"séquentiel   {n} activités  {sequential:6.2f} s")
+
+    for workers in (4, 8, 16):
+        client = StravaClient("bench", max_workers=workers)
+        start = time.perf_counter()
+        sync_concurrent(client, ids)
+        elapsed = time.perf_counter() - start
+        print(f"concurrent x{workers:<2} {n} activités  {elapsed:6.2f} s  (x{sequential / elapsed:.1f})")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
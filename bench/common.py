@@ -0,0 +1,42 @@
+# Outils partagés par les benchmarks : percentiles et ligne de résultat.
+import time
+
+
+def percentile(values, p):
+    # values en secondes, résultat en millisecondes
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+def measure(fn, n):
+    # Appelle fn(i) n fois ; renvoie (latences, durée totale)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(n):
+        t0 = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - start
+
+
+def summarize(name, latencies, elapsed, errors=0):
+    return {
+        "scenario": name,
+        "count": len(latencies),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p90": percentile(latencies, 0.90),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies) * 1000 if latencies else 0.0,
+        "errors": errors,
+    }
+
+
+HEADER = f"{'scénario':<14} {'n':>6} {'débit/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'erreurs':>7}"
+
+
+def format_row(result):
+    return (f"{result['scenario']:<14} {result['count']:>6} {result['throughput']:>9.1f} {result['p50']:>8.2f} "
+            f"{result['p90']:>8.2f} {result['p99']:>8.2f} {result['max']:>8.2f} {result['errors']:>7}")
@@ -0,0 +1,140 @@
+# Jeu de données synthétique et reproductible pour les benchmarks : N
+# utilisateurs, un catalogue d'exos, un historique de PR par utilisateur et des
+# activités avec stream cardio à 1 Hz (compressé comme en production).
+#
+#   python bench/datagen.py /tmp/bench.db --users 20 --prs 500 --activities 30
+import argparse
+import datetime
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, insert, select
+from werkzeug.security import generate_password_hash
+
+from hr_stream import pack_stream, hr_summary, trimp, DEFAULT_ZONE_BOUNDS
+from training_load import chain
+from stub_strava import make_activities, make_stream
+
+PASSWORD = "bench"
+PR_TYPES = ["1rep max", "2reps max", "5reps max", "max reps", "7s max"]
+EXO_NAMES = ["Pull up", "Dips", "Squat", "Deadlift", "Bench press", "Half crimp 20mm",
+             "Open hand 15mm", "Front lever", "Muscle up", "Pistol squat"]
+# Les ids Strava du stub commencent à 10 000 000 : on reste bien au-dessus
+STRAVA_ID_OFFSET = 1_000_000_000
+
+
+def user_email(user_id):
+    return f"user{user_id}@bench.local"
+
+
+def pr_rows(rng, user_id, exo_ids, n):
+    first_day = datetime.date(2018, 1, 1)
+    weight = rng.randint(60, 90)
+    for _ in range(n):
+        pr = rng.choice(PR_TYPES)
+        added_weight = None if pr == "max reps" else rng.randint(0, 60) + rng.choice([0, 0.5])
+        yield {
+            "user_id": user_id,
+            "exo_id": rng.choice(exo_ids),
+            "pr": pr,
+            "quantity": rng.randint(1, 30) if pr == "max reps" else None,
+            "time": rng.randint(5, 12) if pr == "7s max" else None,
+            "added_weight": added_weight,
+            "date": first_day + datetime.timedelta(days=rng.randint(0, 2500)),
+            "weight": weight,
+            "bodyweight": round((weight + added_weight) / weight, 3) * 100 if added_weight is not None else None,
+        }
+
+
+def generate(url, users=10, exos=len(EXO_NAMES), prs=200, activities=10, stream_len=3600, seed=0):
+    # Remplit une base vide (schéma créé depuis les modèles de main.py)
+    from main import (db, User, Exo, Personal_record, PersonalRecordBest, StravaActivity,
+                      HeartRateStream, HeartRateSummary, TrainingLoadDay, merge_pr_best, strava_activity_fields)
+
+    rng = random.Random(seed)
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    password = generate_password_hash(PASSWORD)
+
+    with engine.begin() as conn:
+        conn.execute(insert(Exo.__table__), [
+            {"id": i, "name": EXO_NAMES[i - 1] if i <= len(EXO_NAMES) else f"Exo {i}"}
+            for i in range(1, exos + 1)
+        ])
+        exo_ids = list(range(1, exos + 1))
+
+        for user_id in range(1, users + 1):
+            conn.execute(insert(User.__table__), [{
+                "id": user_id, "name": f"user{user_id}", "email": user_email(user_id),
+                "password": password, "data_version": 0,
+            }])
+
+            records = list(pr_rows(rng, user_id, exo_ids, prs))
+            if records:
+                conn.execute(insert(Personal_record.__table__), records)
+                pending = {}
+                for record in records:
+                    merge_pr_best(pending, user_id, record)
+                conn.execute(insert(PersonalRecordBest.__table__), [{
+                    "user_id": best.user_id, "exo_id": best.exo_id, "pr": best.pr, "best_value": best.best_value,
+                    "best_date": best.best_date, "record_count": best.record_count,
+                } for best in pending.values()])
+
+            loads = {}
+            for i, act in enumerate(make_activities(activities)):
+                strava_id = STRAVA_ID_OFFSET + user_id * 100_000 + i
+                fields = strava_activity_fields(act)
+                start_date = fields["start_date"]
+                activity_id = conn.execute(insert(StravaActivity.__table__).values(
+                    user_id=user_id, strava_id=strava_id, source="strava", **fields
+                )).inserted_primary_key[0]
+                stream = make_stream(strava_id, stream_len)
+                hr, time = stream["heart_rate"]["data"], stream["time"]["data"]
+                conn.execute(insert(HeartRateStream.__table__).values(
+                    activity_id=activity_id, sample_count=len(hr), data=pack_stream(hr, time)
+                ))
+                summary = hr_summary(hr, time, DEFAULT_ZONE_BOUNDS)
+                if summary:
+                    zones = summary.pop("time_in_zone")
+                    summary["trimp"] = trimp(hr, time)
+                    loads[start_date.date()] = loads.get(start_date.date(), 0.0) + summary["trimp"]
+                    conn.execute(insert(HeartRateSummary.__table__).values(
+                        activity_id=activity_id, **summary, **{f"zone{z + 1}": v for z, v in enumerate(zones)}
+                    ))
+            if loads:
+                conn.execute(insert(TrainingLoadDay.__table__), [
+                    {"user_id": user_id, "day": day, "trimp": load, "atl": atl, "ctl": ctl}
+                    for day, load, atl, ctl in chain(None, sorted(loads.items()))
+                ])
+
+        counts = {
+            table.name: conn.execute(select(db.func.count()).select_from(table)).scalar()
+            for table in (User.__table__, Personal_record.__table__, StravaActivity.__table__)
+        }
+    engine.dispose()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--exos", type=int, default=len(EXO_NAMES))
+    parser.add_argument("--prs", type=int, default=200)
+    parser.add_argument("--activities", type=int, default=10)
+    parser.add_argument("--stream-len", type=int, default=3600)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} existe déjà")
+    counts = generate(f"sqlite:///{os.path.abspath(args.path)}", args.users, args.exos, args.prs,
+                      args.activities, args.stream_len, args.seed)
+    print(", ".join(f"{count} {name}" for name, count in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# Suite de benchmarks de bout en bout sur une base synthétique (datagen.py) et
+# le faux serveur Strava (stub_strava.py). Chaque scénario passe par l'app
+# Flask complète (routes, auth, SQL) et rapporte débit et percentiles :
+#
+#   login      POST /login
+#   token_refresh  POST /token/refresh (rotation du refresh token)
+#   pr_list    GET /pr-types, /personal-records/best, /get-personal-record/...
+#   pr_insert  POST /personal-record
+#   training_load  GET /training-load sur 90 jours
+#   full_sync  synchro Strava complète d'un utilisateur (liste + streams)
+#
+#   python bench/run_scenarios.py --requests 500 --json resultats.json
+#   python bench/run_scenarios.py --compare resultats.json   # code 1 si régression
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import HEADER, format_row, measure, summarize
+from datagen import PASSWORD, PR_TYPES, STRAVA_ID_OFFSET, generate, user_email
+from stub_strava import start_stub
+
+SCENARIOS = ["login", "token_refresh", "pr_list", "pr_insert", "training_load", "full_sync"]
+
+
+def scenario_login(main, client, args, rng):
+    errors = []
+
+    def call(_):
+        user_id = rng.randint(1, args.users)
+        response = client.post("/login", json={"email": user_email(user_id), "password": PASSWORD})
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+    # Le hash du mot de passe domine : peu d'itérations suffisent
+    latencies, elapsed = measure(call, max(1, args.requests // 10))
+    return summarize("login", latencies, elapsed, len(errors))
+
+
+def scenario_token_refresh(main, client, args, rng):
+    errors = []
+    with main.app.app_context():
+        refresh_tokens = {user_id: main.issue_refresh_token(user_id) for user_id in range(1, args.users + 1)}
+        main.db.session.commit()
+
+    def call(_):
+        user_id = rng.randint(1, args.users)
+        response = client.post("/token/refresh", json={"refresh_token": refresh_tokens[user_id]})
+        if response.status_code != 200:
+            errors.append(response.status_code)
+            return
+        refresh_tokens[user_id] = response.get_json()["refresh_token"]
+
+    # Même nombre d'appels que login, pour comparer le coût CPU par appel
+    latencies, elapsed = measure(call, max(1, args.requests // 10))
+    return summarize("token_refresh", latencies, elapsed, len(errors))
+
+
+def scenario_pr_list(main, client, args, rng):
+    errors = []
+    headers = {user_id: {"Authorization": "Bearer " + main.generate_token(user_id)}
+               for user_id in range(1, args.users + 1)}
+
+    def call(_):
+        user_id = rng.randint(1, args.users)
+        path = rng.choice([
+            "/pr-types",
+            "/personal-records/best",
+            f"/get-personal-record/{rng.choice(PR_TYPES)}/{rng.randint(1, args.exos)}",
+        ])
+        response = client.get(path, headers=headers[user_id])
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+    latencies, elapsed = measure(call, args.requests)
+    return summarize("pr_list", latencies, elapsed, len(errors))
+
+
+def scenario_pr_insert(main, client, args, rng):
+    errors = []
+    headers = {user_id: {"Authorization": "Bearer " + main.generate_token(user_id)}
+               for user_id in range(1, args.users + 1)}
+
+    def call(_):
+        user_id = rng.randint(1, args.users)
+        response = client.post("/personal-record", headers=headers[user_id], json={
+            "exo_id": rng.randint(1, args.exos), "pr": rng.choice(PR_TYPES), "quantity": None, "time": None,
+            "added_weight": rng.randint(0, 60), "date": "2025-06-01", "weight": 75,
+        })
+        if response.status_code != 201:
+            errors.append(response.status_code)
+
+    latencies, elapsed = measure(call, args.requests)
+    return summarize("pr_insert", latencies, elapsed, len(errors))
+
+
+def scenario_training_load(main, client, args, rng):
+    errors = []
+    headers = {user_id: {"Authorization": "Bearer " + main.generate_token(user_id)}
+               for user_id in range(1, args.users + 1)}
+
+    def call(_):
+        user_id = rng.randint(1, args.users)
+        response = client.get("/training-load?from=2025-03-01&to=2025-05-29", headers=headers[user_id])
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+    latencies, elapsed = measure(call, args.requests)
+    return summarize("training_load", latencies, elapsed, len(errors))
+
+
+def reset_sync(main, user_id):
+    # Repart d'un compte sans activité Strava synchronisée
+    ids = main.db.session.query(main.StravaActivity.id).filter(
+        main.StravaActivity.user_id == user_id, main.StravaActivity.strava_id < STRAVA_ID_OFFSET
+    )
+    main.HeartRateSummary.query.filter(main.HeartRateSummary.activity_id.in_(ids)).delete()
+    main.HeartRateStream.query.filter(main.HeartRateStream.activity_id.in_(ids)).delete()
+    main.StravaActivity.query.filter(main.StravaActivity.id.in_(ids.scalar_subquery())).delete()
+    main.TrainingLoadDay.query.filter_by(user_id=user_id).delete()
+    main.StravaToken.query.filter_by(user_id=user_id).update({"sync_cursor": None})
+    main.db.session.commit()
+
+
+def scenario_full_sync(main, client, args, rng):
+    errors = []
+    user = main.AuthUser(1, "user1", user_email(1))
+    with main.app.app_context():
+        main.db.session.add(main.StravaToken(user_id=1, access_token="bench", refresh_token="bench",
+                                             expires_at=2**31 - 1))
+        main.db.session.commit()
+
+    def call(_):
+        with main.app.app_context():
+            reset_sync(main, user.id)
+            result = main.fetch_strava_activities(user)
+            if isinstance(result, tuple) or result["nombres d'activités"] != args.sync_activities:
+                errors.append(result)
+
+    latencies, elapsed = measure(call, args.syncs)
+    result = summarize("full_sync", latencies, elapsed, len(errors))
+    result["activities_per_s"] = args.sync_activities * len(latencies) / elapsed
+    return result
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as f:
+        baseline = {r["scenario"]: r for r in json.load(f)}
+    regressions = []
+    for result in results:
+        before = baseline.get(result["scenario"])
+        if before is None:
+            continue
+        if result["p99"] > before["p99"] * (1 + tolerance):
+            regressions.append(f"{result['scenario']} : p99 {before['p99']:.2f} -> {result['p99']:.2f} ms")
+        if result["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(f"{result['scenario']} : débit {before['throughput']:.1f} -> {result['throughput']:.1f}/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--exos", type=int, default=10)
+    parser.add_argument("--prs", type=int, default=500)
+    parser.add_argument("--activities", type=int, default=5)
+    parser.add_argument("--syncs", type=int, default=5)
+    parser.add_argument("--sync-activities", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="écrit les résultats dans ce fichier")
+    parser.add_argument("--compare", help="résultats de référence (--json d'un run précédent)")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",")
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"scénarios inconnus : {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        server, base_url = start_stub(activities=args.sync_activities, stream_len=3600, latency=args.latency,
+                                      limit_15min=10**9, limit_daily=10**9)
+        # main lit sa configuration à l'import
+        os.environ["DATABASE_URL"] = url
+        os.environ["STRAVA_BASE_URL"] = base_url
+        # full_sync mesure les téléchargements : pas de cache disque des streams
+        os.environ["STRAVA_STREAM_CACHE_MB"] = "0"
+        import main as app_module
+        # Les spans de la synchro sont journalisés en INFO : on ne garde que les warnings
+        logging.getLogger("sport").setLevel(logging.WARNING)
+
+        generate(url, users=args.users, exos=args.exos, prs=args.prs, activities=args.activities, seed=args.seed)
+        client = app_module.app.test_client()
+        rng = random.Random(args.seed)
+
+        results = []
+        print(HEADER)
+        for name in scenarios:
+            result = globals()[f"scenario_{name}"](app_module, client, args, rng)
+            print(format_row(result))
+            results.append(result)
+
+        server.shutdown()
+        with app_module.app.app_context():
+            app_module.db.engine.dispose()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for line in regressions:
+            print("RÉGRESSION", line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# Faux serveur Strava local pour les benchmarks et les essais de synchro.
+#
+#   python bench/stub_strava.py --port 8765 --activities 50 --latency 0.05
+#   STRAVA_BASE_URL=http://127.0.0.1:8765 flask --app main run
+#
+# Sert /api/v3/athlete, /api/v3/athlete/activities, /api/v3/activities/<id>
+# (et ses streams) et /oauth/token, avec des en-têtes X-RateLimit-* réalistes,
+# une latence simulée et, en option, une part de réponses 429/503 pour tester
+# les retries. revoked=True simule un accès retiré par l'athlète (401 / 400).
+import argparse
+import datetime
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SPORTS = ["Run", "Ride", "Hike", "Swim", "WeightTraining"]
+
+
+def make_activities(n, start=None):
+    # Une activité par jour en remontant le temps, la plus récente en premier
+    start = start or datetime.datetime(2025, 6, 1, 7, 30, tzinfo=datetime.timezone.utc)
+    activities = []
+    for i in range(n):
+        rng = random.Random(i)
+        elapsed = rng.randint(1800, 7200)
+        begin = start - datetime.timedelta(days=i)
+        activities.append({
+            "id": 10_000_000 + i,
+            "name": f"Activité {i}",
+            "sport_type": SPORTS[i % len(SPORTS)],
+            "start_date": begin.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "elapsed_time": elapsed,
+            "moving_time": elapsed - rng.randint(0, 300),
+            "distance": round(elapsed * rng.uniform(2.0, 8.0), 1),
+            "has_heartrate": True,
+            "average_heartrate": round(rng.uniform(120, 160), 1),
+            "max_heartrate": float(rng.randint(165, 195)),
+        })
+    return activities
+
+
+def make_stream(activity_id, length):
+    # Cardio à 1 Hz : montée progressive, oscillations et bruit
+    rng = random.Random(activity_id)
+    base = rng.randint(60, 80)
+    peak = rng.randint(150, 185)
+    hr = []
+    for t in range(length):
+        warmup = min(1.0, t / 600)
+        value = base + (peak - base) * warmup * (0.85 + 0.1 * math.sin(t / 90))
+        hr.append(int(value + rng.gauss(0, 2)))
+    return {
+        "time": {"data": list(range(length)), "series_type": "time", "original_size": length, "resolution": "high"},
+        "heart_rate": {"data": hr, "series_type": "time", "original_size": length, "resolution": "high"},
+    }
+
+
+class StubState:
+    def __init__(self, activities, stream_len=None, latency=0.0, error_rate=0.0,
+                 limit_15min=600, limit_daily=30000, revoked=False):
+        self.activities = activities
+        self.by_id = {a["id"]: a for a in activities}
+        self.stream_len = stream_len
+        self.latency = latency
+        self.error_rate = error_rate
+        self.limits = (limit_15min, limit_daily)
+        self.usage = [0, 0]
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.rng = random.Random(0)
+        self.revoked = revoked
+
+    def count(self, endpoint):
+        with self.lock:
+            self.usage[0] += 1
+            self.usage[1] += 1
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            return self.usage[0] > self.limits[0] or self.usage[1] > self.limits[1]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-RateLimit-Limit", "%d,%d" % self.state.limits)
+        self.send_header("X-RateLimit-Usage", "%d,%d" % tuple(self.state.usage))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _api_call(self, endpoint):
+        # Renvoie True si la requête a déjà reçu une réponse d'erreur
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        if self.state.count(endpoint):
+            self._send(429, {"message": "Rate Limit Exceeded"})
+            return True
+        if self.state.revoked:
+            self._send(401, {"message": "Authorization Error"})
+            return True
+        if self.state.error_rate and self.state.rng.random() < self.state.error_rate:
+            self._send(503, {"message": "Service Unavailable"})
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/")
+
+        if url.path == "/api/v3/athlete":
+            if self._api_call("athlete"):
+                return
+            self._send(200, {"id": 424242})
+        elif url.path == "/api/v3/athlete/activities":
+            if self._api_call("activities"):
+                return
+            per_page = int(query.get("per_page", 30))
+            page = int(query.get("page", 1))
+            activities = self.state.activities
+            if "after" in query:
+                after = int(query["after"])
+                activities = sorted(
+                    (a for a in activities if _epoch(a["start_date"]) > after),
+                    key=lambda a: a["start_date"]
+                )
+            if "before" in query:
+                before = int(query["before"])
+                activities = [a for a in activities if _epoch(a["start_date"]) < before]
+            self._send(200, activities[(page - 1) * per_page:page * per_page])
+        elif len(parts) == 5 and parts[:3] == ["api", "v3", "activities"] and parts[4] == "streams":
+            if self._api_call("streams"):
+                return
+            activity = self.state.by_id.get(int(parts[3]))
+            if not activity:
+                self._send(404, {"message": "Record Not Found"})
+                return
+            length = self.state.stream_len or activity["elapsed_time"]
+            self._send(200, make_stream(activity["id"], length))
+        elif len(parts) == 4 and parts[:3] == ["api", "v3", "activities"]:
+            if self._api_call("activity"):
+                return
+            activity = self.state.by_id.get(int(parts[3]))
+            if not activity:
+                self._send(404, {"message": "Record Not Found"})
+                return
+            self._send(200, activity)
+        else:
+            self._send(404, {"message": "Not Found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        if urlparse(self.path).path == "/oauth/token":
+            self.state.count("token")
+            if self.state.revoked:
+                self._send(400, {"message": "Bad Request", "errors": [{"field": "refresh_token", "code": "invalid"}]})
+                return
+            now = int(time.time())
+            self._send(200, {
+                "token_type": "Bearer",
+                "access_token": f"stub-access-{now}-{self.state.rng.random():.6f}",
+                "refresh_token": f"stub-refresh-{now}-{self.state.rng.random():.6f}",
+                "expires_at": now + 6 * 3600,
+                "expires_in": 6 * 3600,
+                "athlete": {"id": 424242},
+            })
+        else:
+            self._send(404, {"message": "Not Found"})
+
+
+def _epoch(start_date):
+    return int(datetime.datetime.strptime(start_date, "%Y-%m-%dT%H:%M:%SZ")
+               .replace(tzinfo=datetime.timezone.utc).timestamp())
+
+
+def start_stub(port=0, **kwargs):
+    # Démarre le serveur dans un thread ; renvoie (server, base_url)
+    activities = kwargs.pop("activities", None)
+    if activities is None or isinstance(activities, int):
+        activities = make_activities(50 if activities is None else activities)
+    state = StubState(activities, **kwargs)
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux serveur Strava")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--activities", type=int, default=50)
+    parser.add_argument("--stream-len", type=int, default=None)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, base_url = start_stub(
+        port=args.port, activities=args.activities, stream_len=args.stream_len,
+        latency=args.latency, error_rate=args.error_rate,
+    )
+    print(f"Stub Strava sur {base_url}  (STRAVA_BASE_URL={base_url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# Petit cache LRU en mémoire avec durée de vie par entrée, partagé entre
+# les threads d'un même process.
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at=None):
+        # expires_at permet de ne pas dépasser une échéance connue (exp d'un JWT...)
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            self._data[key] = (deadline, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_if(self, predicate):
+        with self._lock:
+            for key in [k for k, (_, value) in self._data.items() if predicate(value)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
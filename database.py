@@ -0,0 +1,55 @@
+# Configuration du moteur SQLAlchemy : URL lue dans l'environnement, pool, et
+# pragmas SQLite posés à chaque nouvelle connexion. Sous gunicorn chaque worker
+# a son propre pool ; c'est le mode WAL + busy_timeout qui évite les
+# "database is locked" entre process (les lecteurs ne bloquent plus derrière
+# un écrivain, et un écrivain attend son tour au lieu d'échouer).
+import os
+import sqlite3
+
+DEFAULT_DATABASE_URL = "sqlite:///main.db"
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # ms
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+
+
+def database_url():
+    url = os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL)
+    # Heroku & co fournissent encore des URL "postgres://"
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def _is_memory_sqlite(url):
+    # sqlite:// et sqlite:///:memory: : SingletonThreadPool, sans pool_size & co
+    path = url.split(":///", 1)[1] if ":///" in url else ""
+    return path in ("", ":memory:") or "mode=memory" in url
+
+
+def engine_options(url):
+    if url.startswith("sqlite") and _is_memory_sqlite(url):
+        return {}
+    options = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+    }
+    if url.startswith("sqlite"):
+        # Attente côté driver alignée sur busy_timeout
+        options["connect_args"] = {"timeout": SQLITE_BUSY_TIMEOUT / 1000}
+    else:
+        options["pool_pre_ping"] = True
+        options["pool_recycle"] = 1800
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # À brancher sur l'événement "connect" du moteur
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.close()
@@ -0,0 +1,155 @@
+# Lecture incrémentale de fichiers FIT (Garmin & co) : on ne garde en mémoire
+# qu'un bloc de lecture et les définitions de messages, jamais le fichier.
+# Seuls les messages "record" (global 20) sont décodés : timestamp + cardio.
+import struct
+
+RECORD_MESG = 20
+FIELD_TIMESTAMP = 253
+FIELD_HEART_RATE = 3
+HR_INVALID = 0xFF
+# Les timestamps FIT comptent depuis le 31/12/1989 00:00 UTC
+FIT_EPOCH_OFFSET = 631065600
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class FitError(Exception):
+    pass
+
+
+class _ChunkReader:
+    # Lecture par blocs sur un flux quelconque (fichier, request.stream...)
+    def __init__(self, stream, chunk_size=_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = b""
+        self.pos = 0
+        self.bytes_read = 0
+
+    def read(self, n):
+        end = self.pos + n
+        if end > len(self.buffer):
+            rest = self.buffer[self.pos:]
+            chunks = [rest]
+            missing = n - len(rest)
+            while missing > 0:
+                chunk = self.stream.read(max(self.chunk_size, missing))
+                if not chunk:
+                    raise FitError("Fichier FIT tronqué")
+                chunks.append(chunk)
+                missing -= len(chunk)
+            self.buffer = b"".join(chunks)
+            self.pos = 0
+            end = n
+        data = self.buffer[self.pos:end]
+        self.pos = end
+        self.bytes_read += n
+        return data
+
+    def at_eof(self):
+        if self.pos < len(self.buffer):
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            return True
+        self.buffer = chunk
+        self.pos = 0
+        return False
+
+
+class _Definition:
+    __slots__ = ("size", "unpack", "timestamp_idx", "hr_idx", "is_record")
+
+    def __init__(self, global_num, big_endian, fields, dev_size):
+        # Un seul struct par définition : les champs inutiles sont sautés ("x")
+        fmt = [">" if big_endian else "<"]
+        wanted = []
+        is_record = global_num == RECORD_MESG
+        for num, size, _base_type in fields:
+            if num == FIELD_TIMESTAMP and size == 4:
+                fmt.append("I")
+                wanted.append(FIELD_TIMESTAMP)
+            elif is_record and num == FIELD_HEART_RATE and size == 1:
+                fmt.append("B")
+                wanted.append(FIELD_HEART_RATE)
+            elif size:
+                fmt.append(f"{size}x")
+        if dev_size:
+            fmt.append(f"{dev_size}x")
+
+        compiled = struct.Struct("".join(fmt))
+        self.size = compiled.size
+        self.unpack = compiled.unpack
+        self.is_record = is_record
+        self.timestamp_idx = wanted.index(FIELD_TIMESTAMP) if FIELD_TIMESTAMP in wanted else None
+        self.hr_idx = wanted.index(FIELD_HEART_RATE) if FIELD_HEART_RATE in wanted else None
+
+
+def _read_header(reader):
+    header_size = reader.read(1)[0]
+    if header_size < 12:
+        raise FitError("En-tête FIT invalide")
+    header = reader.read(header_size - 1)
+    if header[7:11] != b".FIT":
+        raise FitError("Ce n'est pas un fichier FIT")
+    return struct.unpack_from("<I", header, 3)[0]
+
+
+def iter_hr_records(stream):
+    # Génère (timestamp unix, bpm) pour chaque record avec une fréquence cardiaque.
+    # Gère les fichiers FIT chaînés et les en-têtes à timestamp compressé.
+    reader = _ChunkReader(stream)
+    while not reader.at_eof():
+        data_size = _read_header(reader)
+        data_end = reader.bytes_read + data_size
+        definitions = {}
+        last_timestamp = None
+
+        while reader.bytes_read < data_end:
+            header = reader.read(1)[0]
+
+            if header & 0x80:
+                # En-tête compressé : type local sur 2 bits, décalage de 5 bits
+                local = (header >> 5) & 0x03
+                offset = header & 0x1F
+                definition = definitions.get(local)
+                if definition is None:
+                    raise FitError(f"Message local {local} sans définition")
+                values = definition.unpack(reader.read(definition.size))
+                timestamp = None
+                if last_timestamp is not None:
+                    timestamp = (last_timestamp & ~0x1F) + offset
+                    if offset < (last_timestamp & 0x1F):
+                        timestamp += 0x20
+                    last_timestamp = timestamp
+            elif header & 0x40:
+                # Message de définition
+                local = header & 0x0F
+                _reserved, architecture = reader.read(2)
+                big_endian = architecture == 1
+                global_num, nb_fields = struct.unpack(">HB" if big_endian else "<HB", reader.read(3))
+                raw = reader.read(nb_fields * 3)
+                fields = [tuple(raw[i:i + 3]) for i in range(0, len(raw), 3)]
+                dev_size = 0
+                if header & 0x20:
+                    nb_dev = reader.read(1)[0]
+                    dev_raw = reader.read(nb_dev * 3)
+                    dev_size = sum(dev_raw[i + 1] for i in range(0, len(dev_raw), 3))
+                definitions[local] = _Definition(global_num, big_endian, fields, dev_size)
+                continue
+            else:
+                local = header & 0x0F
+                definition = definitions.get(local)
+                if definition is None:
+                    raise FitError(f"Message local {local} sans définition")
+                values = definition.unpack(reader.read(definition.size))
+                timestamp = None
+                if definition.timestamp_idx is not None:
+                    timestamp = last_timestamp = values[definition.timestamp_idx]
+
+            if definition.is_record and definition.hr_idx is not None and timestamp is not None:
+                hr = values[definition.hr_idx]
+                if hr != HR_INVALID:
+                    yield timestamp + FIT_EPOCH_OFFSET, hr
+
+        reader.read(2)  # CRC du fichier
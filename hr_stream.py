@@ -0,0 +1,300 @@
+# Format binaire compact pour les streams cardio d'une activité.
+#
+# Un blob = en-tête + section "time" + section "hr". Chaque série est
+# stockée en deltas (premier point absolu) dans un array signé, puis
+# éventuellement compressée avec zlib : à 1 Hz les deltas valent presque
+# toujours 0/1, ce qui se compresse très bien.
+import struct
+import sys
+import zlib
+from array import array
+from itertools import accumulate
+
+import numpy as np
+
+FORMAT_VERSION = 1
+FLAG_ZLIB = 0x01
+
+# version, flags, nombre de samples, taille de la section time
+_HEADER = struct.Struct("<BBII")
+
+# Limites basses des zones 2 à 5 (bpm) quand l'utilisateur n'a rien configuré
+DEFAULT_ZONE_BOUNDS = (120, 140, 155, 170)
+# Au-delà, un écart entre deux samples est une pause : on ne le compte pas en entier
+MAX_SAMPLE_GAP = 30
+# Fréquences de repos et max quand l'utilisateur n'a rien configuré
+DEFAULT_RESTING_HR = 60
+DEFAULT_MAX_HR = 190
+
+
+def _deltas(values, prev=0):
+    for v in values:
+        yield v - prev
+        prev = v
+
+
+def _to_bytes(arr):
+    # Stockage little-endian quel que soit l'hôte
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _from_bytes(typecode, raw):
+    arr = array(typecode)
+    arr.frombytes(raw)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+class StreamEncoder:
+    # Encodage par lots (import FIT...) : seule la sortie compressée reste en
+    # mémoire, jamais le stream complet.
+    def __init__(self, compress=True):
+        self.count = 0
+        self._prev_hr = 0
+        self._prev_time = 0
+        self._time_parts = []
+        self._hr_parts = []
+        self._time_z = zlib.compressobj() if compress else None
+        self._hr_z = zlib.compressobj() if compress else None
+
+    def extend(self, hr_values, time_values):
+        hr_values = list(hr_values)
+        time_values = list(time_values)
+        if len(hr_values) != len(time_values):
+            raise ValueError("hr et time doivent avoir la même longueur")
+        if not hr_values:
+            return
+
+        time_raw = _to_bytes(array("i", _deltas(time_values, self._prev_time)))
+        hr_raw = _to_bytes(array("h", _deltas(hr_values, self._prev_hr)))
+        self._prev_time = time_values[-1]
+        self._prev_hr = hr_values[-1]
+        self.count += len(hr_values)
+
+        if self._time_z:
+            time_raw = self._time_z.compress(time_raw)
+            hr_raw = self._hr_z.compress(hr_raw)
+        self._time_parts.append(time_raw)
+        self._hr_parts.append(hr_raw)
+
+    def finish(self):
+        flags = 0
+        if self._time_z:
+            flags |= FLAG_ZLIB
+            self._time_parts.append(self._time_z.flush())
+            self._hr_parts.append(self._hr_z.flush())
+        time_raw = b"".join(self._time_parts)
+        hr_raw = b"".join(self._hr_parts)
+
+        header = _HEADER.pack(FORMAT_VERSION, flags, self.count, len(time_raw))
+        return header + time_raw + hr_raw
+
+
+def pack_stream(hr_values, time_values, compress=True):
+    encoder = StreamEncoder(compress)
+    encoder.extend(hr_values, time_values)
+    return encoder.finish()
+
+
+def unpack_stream(blob):
+    version, flags, count, time_len = _HEADER.unpack_from(blob)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Version de stream inconnue : {version}")
+
+    start = _HEADER.size
+    time_raw = blob[start:start + time_len]
+    hr_raw = blob[start + time_len:]
+    if flags & FLAG_ZLIB:
+        time_raw = zlib.decompress(time_raw)
+        hr_raw = zlib.decompress(hr_raw)
+
+    time_deltas = _from_bytes("i", time_raw)
+    hr_deltas = _from_bytes("h", hr_raw)
+    if len(time_deltas) != count or len(hr_deltas) != count:
+        raise ValueError("Stream corrompu : nombre de samples incohérent")
+
+    hr = array("H", accumulate(hr_deltas))
+    time = array("I", accumulate(time_deltas))
+    return hr, time
+
+
+class _DeltaReader:
+    # Lecture par lots d'une section (deltas, éventuellement compressés) d'un blob
+    def __init__(self, raw, typecode, compressed):
+        self.typecode = typecode
+        self.itemsize = array(typecode).itemsize
+        self.raw = raw
+        self.z = zlib.decompressobj() if compressed else None
+        self.prev = 0
+
+    def read(self, n):
+        size = n * self.itemsize
+        if self.z:
+            parts, got = [], 0
+            while got < size and (self.raw or not self.z.eof):
+                part = self.z.decompress(self.raw, size - got)
+                self.raw = self.z.unconsumed_tail
+                if not part:
+                    break
+                parts.append(part)
+                got += len(part)
+            data = b"".join(parts)
+        else:
+            data, self.raw = bytes(self.raw[:size]), self.raw[size:]
+        if len(data) != size:
+            raise ValueError("Stream corrompu : nombre de samples incohérent")
+        values = np.cumsum(np.frombuffer(data, dtype=np.dtype(self.typecode).newbyteorder("<")), dtype=np.int64) + self.prev
+        if len(values):
+            self.prev = int(values[-1])
+        return values
+
+
+def iter_stream(blob, batch_size=4096):
+    # Comme unpack_stream, mais par lots (hr, time) de tableaux numpy : le stream
+    # complet n'est jamais matérialisé, seul le blob compressé reste en mémoire
+    version, flags, count, time_len = _HEADER.unpack_from(blob)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Version de stream inconnue : {version}")
+
+    start = _HEADER.size
+    view = memoryview(blob)
+    compressed = bool(flags & FLAG_ZLIB)
+    time_reader = _DeltaReader(view[start:start + time_len], "i", compressed)
+    hr_reader = _DeltaReader(view[start + time_len:], "h", compressed)
+    for offset in range(0, count, batch_size):
+        n = min(batch_size, count - offset)
+        yield hr_reader.read(n), time_reader.read(n)
+
+
+def downsample_minmax(hr_values, time_values, points):
+    # Réduit le stream à ~points échantillons en gardant, pour chaque
+    # intervalle, le min et le max de la fréquence cardiaque (les pics
+    # restent visibles sur le graphe). Premier et dernier points conservés.
+    hr = np.asarray(hr_values)
+    time = np.asarray(time_values)
+    n = len(hr)
+    buckets = (points - 2) // 2
+    if n <= points or buckets < 1:
+        return hr, time
+
+    bucket = np.arange(n) * buckets // n
+    # Tri par intervalle puis par hr : le premier de chaque groupe est le min, le dernier le max
+    order = np.lexsort((hr, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(buckets))
+    ends = np.append(starts[1:], n) - 1
+    keep = np.unique(np.concatenate((order[starts], order[ends], [0, n - 1])))
+    return hr[keep], time[keep]
+
+
+def hr_summary(hr_values, time_values, zone_bounds=DEFAULT_ZONE_BOUNDS):
+    # Temps passé dans chaque zone, moyenne, max et dérive cardiaque, chaque
+    # sample étant pondéré par la durée jusqu'au suivant (pauses plafonnées).
+    hr = np.asarray(hr_values, dtype=np.float64)
+    time = np.asarray(time_values, dtype=np.float64)
+    if len(hr) < 2:
+        return None
+
+    dt = np.clip(np.diff(time), 0, MAX_SAMPLE_GAP)
+    hr_w = hr[:-1]
+    total = dt.sum()
+    if total <= 0:
+        return None
+
+    zones = np.searchsorted(np.asarray(zone_bounds), hr_w, side="right")
+    time_in_zone = np.bincount(zones, weights=dt, minlength=len(zone_bounds) + 1)
+
+    # Dérive : moyenne pondérée de la 2e moitié (en temps) par rapport à la 1re
+    elapsed = np.cumsum(dt)
+    second = elapsed > total / 2
+    first_w, second_w = dt[~second].sum(), dt[second].sum()
+    drift = None
+    if first_w > 0 and second_w > 0:
+        first_avg = (hr_w[~second] * dt[~second]).sum() / first_w
+        second_avg = (hr_w[second] * dt[second]).sum() / second_w
+        drift = float((second_avg - first_avg) / first_avg * 100)
+
+    return {
+        "duration": int(round(total)),
+        "avg_hr": float((hr_w * dt).sum() / total),
+        "max_hr": int(hr.max()),
+        "hr_drift": drift,
+        "time_in_zone": [int(round(v)) for v in time_in_zone],
+    }
+
+
+def trimp(hr_values, time_values, resting_hr=DEFAULT_RESTING_HR, max_hr=DEFAULT_MAX_HR):
+    # TRIMP de Banister : minutes x fraction de FC de réserve x 0.64 e^(1.92 x fraction)
+    hr = np.asarray(hr_values, dtype=np.float64)
+    time = np.asarray(time_values, dtype=np.float64)
+    if len(hr) < 2 or max_hr <= resting_hr:
+        return None
+
+    minutes = np.clip(np.diff(time), 0, MAX_SAMPLE_GAP) / 60
+    reserve = np.clip((hr[:-1] - resting_hr) / (max_hr - resting_hr), 0, 1)
+    return float((minutes * reserve * 0.64 * np.exp(1.92 * reserve)).sum())
+
+
+def _with_previous(previous, hr, time):
+    # Le premier sample d'un lot a besoin du dernier du lot précédent pour son écart
+    if previous is None:
+        return hr.astype(np.float64), time.astype(np.float64)
+    return np.concatenate(([previous[0]], hr)).astype(np.float64), np.concatenate(([previous[1]], time)).astype(np.float64)
+
+
+def stream_summary(blob, zone_bounds=DEFAULT_ZONE_BOUNDS, resting_hr=DEFAULT_RESTING_HR, max_hr=DEFAULT_MAX_HR):
+    # hr_summary et trimp d'un blob, décodé par lots (import FIT) : la mémoire
+    # dépend de la taille du blob compressé, pas du nombre de samples. Deux
+    # passages, la dérive ayant besoin de la durée totale. -> (résumé, trimp)
+    bounds = np.asarray(zone_bounds)
+    count = total = weighted = load = 0.0
+    peak = None
+    time_in_zone = np.zeros(len(zone_bounds) + 1)
+    previous = None
+    for hr, time in iter_stream(blob):
+        count += len(hr)
+        hr, time = _with_previous(previous, hr, time)
+        previous = hr[-1], time[-1]
+        peak = hr.max() if peak is None else max(peak, hr.max())
+        dt = np.clip(np.diff(time), 0, MAX_SAMPLE_GAP)
+        hr_w = hr[:-1]
+        total += dt.sum()
+        weighted += (hr_w * dt).sum()
+        time_in_zone += np.bincount(np.searchsorted(bounds, hr_w, side="right"), weights=dt, minlength=len(zone_bounds) + 1)
+        if max_hr > resting_hr:
+            reserve = np.clip((hr_w - resting_hr) / (max_hr - resting_hr), 0, 1)
+            load += (dt / 60 * reserve * 0.64 * np.exp(1.92 * reserve)).sum()
+    if count < 2:
+        return None, None
+    load = float(load) if max_hr > resting_hr else None
+    if total <= 0:
+        return None, load
+
+    # Dérive : mêmes moitiés (en temps) que hr_summary
+    elapsed = 0.0
+    sums = np.zeros(2)
+    weights = np.zeros(2)
+    previous = None
+    for hr, time in iter_stream(blob):
+        hr, time = _with_previous(previous, hr, time)
+        previous = hr[-1], time[-1]
+        dt = np.clip(np.diff(time), 0, MAX_SAMPLE_GAP)
+        second = elapsed + np.cumsum(dt) > total / 2
+        elapsed += dt.sum()
+        sums += (hr[:-1][~second] * dt[~second]).sum(), (hr[:-1][second] * dt[second]).sum()
+        weights += dt[~second].sum(), dt[second].sum()
+    drift = None
+    if weights[0] > 0 and weights[1] > 0:
+        first_avg, second_avg = sums / weights
+        drift = float((second_avg - first_avg) / first_avg * 100)
+
+    return {
+        "duration": int(round(total)),
+        "avg_hr": float(weighted / total),
+        "max_hr": int(peak),
+        "hr_drift": drift,
+        "time_in_zone": [int(round(v)) for v in time_in_zone],
+    }, load
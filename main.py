@@ -1,32 +1,116 @@
-from flask import Flask, request, jsonify, render_template, redirect
+from flask import Flask, request, jsonify, render_template, make_response, g
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import datetime
+import hashlib
+import secrets
+import csv
+import io
+import json
+import math
+import pickle
+import tempfile
+import click
 from functools import wraps
+from collections import namedtuple
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor
 from flask_migrate import Migrate
 import os
+import time
+import threading
 import requests
 from urllib.parse import urlencode
+from sqlalchemy import event, update, insert, or_
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+from sqlalchemy.engine import Engine
+from cache import TTLCache
+import metrics
+from metrics import span
+from database import database_url, engine_options, set_sqlite_pragmas
+from pagination import paginated_response
+from hr_stream import (pack_stream, unpack_stream, downsample_minmax, hr_summary, trimp, stream_summary, StreamEncoder,
+                       DEFAULT_ZONE_BOUNDS, DEFAULT_RESTING_HR, DEFAULT_MAX_HR)
+from training_load import chain, daily_series
+from pr_analytics import progression, pr_score, DEFAULT_WINDOWS, MAX_WINDOW_DAYS
+from fit_reader import iter_hr_records, FitError
+from stream_cache import StreamCache
+from strava_client import (StravaClient, StravaError, RateLimitExceeded, BudgetExhausted, RequestBudget,
+                           rate_limiter, STRAVA_OAUTH_URL, request_token)
 
 app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///main.db"
+app.config["SQLALCHEMY_DATABASE_URI"] = database_url()
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
 db = SQLAlchemy()
 db.init_app(app)
 migrate = Migrate(app, db)
+metrics.init_app(app)
 
 SECRET_KEY = os.getenv("SECRET_KEY", "fallback_key")
 STRAVA_CLIENT_ID = os.getenv("STRAVA_CLIENT_ID")
 STRAVA_CLIENT_SECRET = os.getenv("STRAVA_CLIENT_SECRET")
 STRAVA_REDIRECT_URI = os.getenv("STRAVA_REDIRECT_URI")
+# Webhook : jeton choisi à la création de l'abonnement et id de l'abonnement ;
+# sans id configuré, les événements sont refusés
+STRAVA_WEBHOOK_VERIFY_TOKEN = os.getenv("STRAVA_WEBHOOK_VERIFY_TOKEN")
+STRAVA_WEBHOOK_SUBSCRIPTION_ID = os.getenv("STRAVA_WEBHOOK_SUBSCRIPTION_ID")
+STRAVA_PAGE_SIZE = 200
+# Le process qui porte un job (en file ou en cours) rafraîchit son heartbeat_at ;
+# sans nouvelles depuis SYNC_JOB_STALE, le worker est mort : le job est relancé
+# s'il a moins de SYNC_JOB_TIMEOUT, abandonné sinon
+SYNC_JOB_TIMEOUT = datetime.timedelta(hours=1)
+SYNC_JOB_HEARTBEAT = datetime.timedelta(seconds=30)
+SYNC_JOB_STALE = 3 * SYNC_JOB_HEARTBEAT
+# Synchro de tous les comptes : intervalle entre deux passages (s) et plafond de
+# requêtes Strava par utilisateur et par passage
+STRAVA_SYNC_INTERVAL = int(os.getenv("STRAVA_SYNC_INTERVAL", "900"))
+STRAVA_SYNC_USER_CAP = int(os.getenv("STRAVA_SYNC_USER_CAP", "200"))
+STRAVA_OAUTH_STATE_TTL = datetime.timedelta(minutes=10)
+STRAVA_STREAM_KEYS = "heart_rate,time"
+HR_GRAPH_POINTS = 800
+FIT_BATCH_SIZE = 1000
+PR_IMPORT_BATCH_SIZE = 1000
+# Au-delà, les lignes validées d'un import attendent sur disque plutôt qu'en mémoire
+PR_IMPORT_SPOOL_BYTES = 8 * 2**20
+TRAINING_LOAD_DEFAULT_DAYS = 90
+TRAINING_LOAD_MAX_DAYS = 3 * 366
+# Refresh anticipé du token Strava et durée max du bail de refresh (secondes)
+STRAVA_TOKEN_MARGIN = 300
+STRAVA_REFRESH_LEASE = 30
+STRAVA_REFRESH_WAIT = 35
+
+# Réponses brutes des streams Strava, sur disque ; STRAVA_STREAM_CACHE_MB=0 le désactive
+STRAVA_STREAM_CACHE_MB = int(os.getenv("STRAVA_STREAM_CACHE_MB", "512"))
+stream_cache = StreamCache(
+    os.getenv("STRAVA_STREAM_CACHE_DIR", os.path.join(app.instance_path, "stream_cache")),
+    max_bytes=STRAVA_STREAM_CACHE_MB * 2**20
+) if STRAVA_STREAM_CACHE_MB > 0 else None
+
+# Refresh tokens : durée de vie (glissante, renouvelée à chaque rotation) et délai
+# pendant lequel un token tout juste remplacé est refusé sans révoquer la session
+# (deux onglets qui rafraîchissent en même temps)
+REFRESH_TOKEN_TTL = datetime.timedelta(days=int(os.getenv("REFRESH_TOKEN_DAYS", "30")))
+REFRESH_TOKEN_REUSE_GRACE = datetime.timedelta(seconds=10)
+
+# Utilisateur vu par les routes protégées : pas d'objet ORM, pas de requête SQL
+AuthUser = namedtuple("AuthUser", ["id", "name", "email"])
+# token JWT -> AuthUser, borné par la durée de vie du token
+auth_cache = TTLCache(maxsize=1024, ttl=int(os.getenv("AUTH_CACHE_TTL", "60")))
+# (user, data_version, fenêtres, jour) -> analyse des PR : un ajout ou une
+# suppression de PR change la version, l'ancienne entrée n'est plus jamais lue
+pr_progression_cache = TTLCache(maxsize=256, ttl=3600)
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(128), nullable=False)
+    # Incrémenté à chaque écriture visible dans les listes (ETag des GET)
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     def set_password(self, password):
         self.password = generate_password_hash(password)
@@ -39,12 +123,17 @@ class Exo(db.Model):
     name = db.Column(db.String(100), nullable=False)
 
 class Personal_record(db.Model):
+    # Historique d'un PR : user -> exo -> type de PR, trié par date
+    __table_args__ = (
+        db.Index('ix_personal_record_user_exo_pr_date', 'user_id', 'exo_id', 'pr', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     pr = db.Column(db.String(100))
     quantity = db.Column(db.Integer)
-    time = db.Column(db.String(100))
+    time = db.Column(db.Integer)  # durée en secondes
     added_weight = db.Column(db.Float)
-    date = db.Column(db.String(100))
+    date = db.Column(db.Date)
     exo_id = db.Column(db.Integer, db.ForeignKey('exo.id', name='fk_personal_record_exo_id'), nullable=False)
     exo = db.relationship('Exo')
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_personal_record_user_id'), nullable=False)
@@ -52,18 +141,133 @@ class Personal_record(db.Model):
     weight = db.Column(db.Integer)
     bodyweight = db.Column(db.Float)
 
+class PersonalRecordBest(db.Model):
+    # Meilleure valeur par (user, exo, type de PR), tenue à jour à chaque écriture
+    # (voir update_pr_best) ; "flask rebuild-pr-best" la recalcule entièrement
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'exo_id', 'pr', name='uq_personal_record_best_user_exo_pr'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_personal_record_best_user_id'), nullable=False)
+    exo_id = db.Column(db.Integer, db.ForeignKey('exo.id', name='fk_personal_record_best_exo_id'), nullable=False)
+    exo = db.relationship('Exo')
+    pr = db.Column(db.String(100))
+    best_value = db.Column(db.Float)
+    best_date = db.Column(db.Date)
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def merge(self, value, date, count=1):
+        # Plus grande valeur ; à égalité, la date la plus ancienne (première fois atteinte)
+        self.record_count += count
+        if value is None:
+            return
+        if (self.best_value is None or value > self.best_value
+                or (value == self.best_value and date is not None and (self.best_date is None or date < self.best_date))):
+            self.best_value = value
+            self.best_date = date
+
 class StravaActivity(db.Model):
+    __table_args__ = (
+        db.Index('ix_strava_activity_user_start_date', 'user_id', 'start_date'),
+        db.Index('ix_strava_activity_user_sport_type', 'user_id', 'sport_type'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_stravaactivity_user_id'), nullable=False)
     user = db.relationship('User')
-    strava_id = db.Column(db.BigInteger, unique=True, nullable=False)
+    # Vide pour les activités qui ne viennent pas de Strava (import FIT)
+    strava_id = db.Column(db.BigInteger, unique=True, nullable=True)
+    source = db.Column(db.String(20), nullable=False, default="strava", server_default="strava")
+    start_date = db.Column(db.DateTime)  # UTC
+    # Résumé renvoyé par /athlete/activities, gardé pour lister sans appeler Strava
+    name = db.Column(db.String(255))
+    sport_type = db.Column(db.String(50))
+    elapsed_time = db.Column(db.Integer)  # secondes
+    moving_time = db.Column(db.Integer)
+    distance = db.Column(db.Float)  # mètres
+    avg_hr = db.Column(db.Float)
+    max_hr = db.Column(db.Integer)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "strava_id": self.strava_id,
+            "source": self.source,
+            "name": self.name,
+            "sport_type": self.sport_type,
+            "start_date": self.start_date.isoformat() + "Z" if self.start_date else None,
+            "elapsed_time": self.elapsed_time,
+            "moving_time": self.moving_time,
+            "distance": self.distance,
+            "avg_hr": self.avg_hr,
+            "max_hr": self.max_hr
+        }
+
+class HeartRateStream(db.Model):
+    # Tout le stream cardio d'une activité dans une seule ligne (voir hr_stream.py)
+    id = db.Column(db.Integer, primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('strava_activity.id', name='fk_heart_rate_stream_activity_id'), unique=True, nullable=False)
+    activity = db.relationship('StravaActivity', backref=db.backref('hr_stream', uselist=False))
+    sample_count = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+
+    def arrays(self):
+        # -> (array('H') hr, array('I') time)
+        return unpack_stream(self.data)
+
+class HeartRateProfile(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_heart_rate_profile_user_id'), unique=True, nullable=False)
+    user = db.relationship('User')
+    # Limites basses des zones 2 à 5, ex. "120,140,155,170"
+    zone_bounds = db.Column(db.String(100), nullable=False)
+    # Pour la TRIMP ; vides = DEFAULT_RESTING_HR / DEFAULT_MAX_HR
+    resting_hr = db.Column(db.Integer)
+    max_hr = db.Column(db.Integer)
 
-class HeartRateSample(db.Model):
+    def bounds(self):
+        return tuple(int(v) for v in self.zone_bounds.split(","))
+
+class HeartRateSummary(db.Model):
+    # Analyse cardio calculée une fois à l'import (voir hr_stream.hr_summary)
     id = db.Column(db.Integer, primary_key=True)
-    activity_id = db.Column(db.Integer, db.ForeignKey('strava_activity.id'), nullable=False)
-    activity = db.relationship('StravaActivity',backref=db.backref('samples', lazy=True))
-    hr = db.Column(db.Integer, nullable=False)
-    time = db.Column(db.Integer, nullable=False)
+    activity_id = db.Column(db.Integer, db.ForeignKey('strava_activity.id', name='fk_heart_rate_summary_activity_id'), unique=True, nullable=False)
+    activity = db.relationship('StravaActivity', backref=db.backref('hr_summary', uselist=False))
+    duration = db.Column(db.Integer, nullable=False)
+    avg_hr = db.Column(db.Float, nullable=False)
+    max_hr = db.Column(db.Integer, nullable=False)
+    hr_drift = db.Column(db.Float)
+    zone1 = db.Column(db.Integer, nullable=False)
+    zone2 = db.Column(db.Integer, nullable=False)
+    zone3 = db.Column(db.Integer, nullable=False)
+    zone4 = db.Column(db.Integer, nullable=False)
+    zone5 = db.Column(db.Integer, nullable=False)
+    trimp = db.Column(db.Float)
+
+    def to_dict(self):
+        return {
+            "duration": self.duration,
+            "avg_hr": round(self.avg_hr, 1),
+            "max_hr": self.max_hr,
+            "hr_drift": round(self.hr_drift, 2) if self.hr_drift is not None else None,
+            "time_in_zone": [self.zone1, self.zone2, self.zone3, self.zone4, self.zone5],
+            "trimp": round(self.trimp, 1) if self.trimp is not None else None
+        }
+
+class TrainingLoadDay(db.Model):
+    # Charge d'un jour avec activité, et moyennes aiguë/chronique en fin de journée
+    # (voir training_load.py) ; les jours sans activité ne sont pas stockés
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', name='uq_training_load_day_user_day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_training_load_day_user_id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    trimp = db.Column(db.Float, nullable=False)
+    atl = db.Column(db.Float, nullable=False)
+    ctl = db.Column(db.Float, nullable=False)
 
 class StravaToken(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -73,6 +277,86 @@ class StravaToken(db.Model):
     refresh_token = db.Column(db.String(255), nullable=False)
     expires_at = db.Column(db.Integer, nullable=False)
     strava_athlete_id = db.Column(db.Integer, nullable=True)
+    # Date de début (timestamp) de la plus récente activité synchronisée
+    sync_cursor = db.Column(db.Integer, nullable=True)
+    # Bail pris par le process qui rafraîchit le token (timestamp d'expiration)
+    refresh_lease_until = db.Column(db.Integer, nullable=True)
+    # Fin de la dernière synchro complète (tout l'historique parcouru)
+    last_synced_at = db.Column(db.DateTime, nullable=True)
+
+class SyncJob(db.Model):
+    # File de synchros Strava : une ligne par demande, mise à jour par le worker
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_sync_job_user_id'), nullable=False)
+    user = db.relationship('User')
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued, running, done, failed
+    # sync : synchro complète ; activity / delete : une seule activité (webhook) ;
+    # deauthorize : révocation de l'accès annoncée par le webhook
+    kind = db.Column(db.String(20), nullable=False, default="sync", server_default="sync")
+    strava_id = db.Column(db.BigInteger)
+    message = db.Column(db.String(255))
+    activities_found = db.Column(db.Integer, nullable=False, default=0)
+    streams_fetched = db.Column(db.Integer, nullable=False, default=0)
+    samples_written = db.Column(db.Integer, nullable=False, default=0)
+    # Plafond de requêtes Strava du job (None : seulement le quota de l'app) et consommation
+    request_budget = db.Column(db.Integer)
+    requests_used = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Dernier signe de vie du process qui porte le job (voir SYNC_JOB_HEARTBEAT)
+    heartbeat_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    def to_dict(self):
+        end = self.finished_at or datetime.datetime.utcnow()
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "strava_id": self.strava_id,
+            "status": self.status,
+            "message": self.message,
+            "activities_found": self.activities_found,
+            "streams_fetched": self.streams_fetched,
+            "samples_written": self.samples_written,
+            "request_budget": self.request_budget,
+            "requests_used": self.requests_used,
+            "elapsed": round((end - self.started_at).total_seconds(), 3) if self.started_at else None,
+        }
+
+class RefreshToken(db.Model):
+    # Seul le hash est stocké. Chaque /token/refresh remplace le token par un
+    # nouveau de la même famille (une famille = une connexion) ; un token déjà
+    # remplacé qui revient signale un vol : toute la famille est révoquée.
+    __table_args__ = (
+        db.Index('ix_refresh_token_family_id', 'family_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_refresh_token_user_id'), nullable=False)
+    token_hash = db.Column(db.String(64), nullable=False, unique=True)
+    family_id = db.Column(db.String(32), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    rotated_at = db.Column(db.DateTime)
+    revoked_at = db.Column(db.DateTime)
+
+# Un token en cache ne doit plus servir si le compte disparaît ou change de mot de passe.
+# Les autres workers gunicorn l'oublient au plus tard après AUTH_CACHE_TTL.
+@event.listens_for(User, "after_update")
+def invalidate_auth_on_password_change(mapper, connection, target):
+    if db.inspect(target).attrs.password.history.has_changes():
+        auth_cache.discard_if(lambda user: user.id == target.id)
+        # Les sessions ouvertes avec l'ancien mot de passe ne se renouvellent plus
+        connection.execute(
+            update(RefreshToken.__table__)
+            .where(RefreshToken.user_id == target.id, RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=datetime.datetime.utcnow())
+        )
+
+@event.listens_for(User, "after_delete")
+def invalidate_auth_on_delete(mapper, connection, target):
+    auth_cache.discard_if(lambda user: user.id == target.id)
+
+event.listen(Engine, "connect", set_sqlite_pragmas)
 
 def token_required(f):
     @wraps(f)
@@ -86,18 +370,49 @@ def token_required(f):
         if not token:
             return jsonify({"message": "Token manquant"}), 401
 
-        try:
-            data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-            current_user = User.query.get(data["user_id"])
-            if not current_user:
-                raise Exception("User not found")
-        except Exception as e:
-            return jsonify({"message": f"Token invalide : {str(e)}"}), 401
+        current_user = auth_cache.get(token)
+        if current_user is None:
+            try:
+                data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+                user = db.session.get(User, data["user_id"])
+                if not user:
+                    raise Exception("User not found")
+            except Exception as e:
+                return jsonify({"message": f"Token invalide : {str(e)}"}), 401
+            current_user = AuthUser(user.id, user.name, user.email)
+            auth_cache.set(token, current_user, expires_at=data["exp"])
 
         return f(current_user, *args, **kwargs)
 
     return decorated
 
+def bump_data_version(user_id=None):
+    # Sans user_id : donnée commune (catalogue d'exos), tous les utilisateurs
+    stmt = update(User).values(data_version=User.data_version + 1)
+    if user_id is not None:
+        stmt = stmt.where(User.id == user_id)
+    db.session.execute(stmt)
+
+def etag_by_data_version(f):
+    # À placer sous @token_required. Tant que la version de l'utilisateur n'a pas
+    # bougé, un GET avec le même If-None-Match repart en 304 sans toucher aux tables.
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        version = db.session.query(User.data_version).filter_by(id=current_user.id).scalar()
+        g.data_version = version
+        etag = hashlib.sha1(f"{current_user.id}:{version}:{request.full_path}".encode()).hexdigest()[:20]
+        if request.if_none_match.contains_weak(etag):
+            response = make_response("", 304)
+        else:
+            response = make_response(f(current_user, *args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+    return decorated
+
 def generate_token(user_id):
     payload = {
         "user_id": user_id,
@@ -106,78 +421,884 @@ def generate_token(user_id):
     token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
     return token
 
-def fetch_strava_activities(current_user):
-    token = StravaToken.query.filter_by(user_id=current_user.id).first()
-
-    if not token:
-        return {"message": "Token Strava manquant"}, 400
+def hash_refresh_token(token):
+    # Le token est aléatoire (256 bits) : un hash rapide suffit, contrairement au mot de passe
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def issue_refresh_token(user_id, family_id=None):
+    token = secrets.token_urlsafe(32)
+    db.session.add(RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token),
+        family_id=family_id or secrets.token_hex(16),
+        expires_at=datetime.datetime.utcnow() + REFRESH_TOKEN_TTL
+    ))
+    return token
 
-    # Vérifie si le token est expiré
-    if token.expires_at < datetime.datetime.utcnow().timestamp():
-        refresh_response = requests.post("https://www.strava.com/oauth/token", data={
-            "client_id": STRAVA_CLIENT_ID,
-            "client_secret": STRAVA_CLIENT_SECRET,
-            "grant_type": "refresh_token",
-            "refresh_token": token.refresh_token
-        })
-        if refresh_response.status_code != 200:
-            return {"message": "Erreur lors du refresh du token"}, 400
+def revoke_refresh_family(family_id):
+    db.session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.datetime.utcnow())
+    )
 
-        new_tokens = refresh_response.json()
-        token.access_token = new_tokens["access_token"]
-        token.refresh_token = new_tokens["refresh_token"]
-        token.expires_at = new_tokens["expires_at"]
+def strava_oauth_state(user_id):
+    # Passé à Strava et rendu tel quel au callback : relie le compte Strava à l'utilisateur
+    payload = {
+        "user_id": user_id,
+        "purpose": "strava_oauth",
+        "exp": datetime.datetime.utcnow() + STRAVA_OAUTH_STATE_TTL
+    }
+    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+
+def save_hr_stream(activity_id, hr_values, time_values):
+    # Tout le stream est encodé dans un seul blob : une ligne par activité
+    data = pack_stream(hr_values, time_values)
+    sample_count = len(hr_values)
+    stream = HeartRateStream.query.filter_by(activity_id=activity_id).first()
+    if stream:
+        stream.sample_count = sample_count
+        stream.data = data
+    else:
+        db.session.add(HeartRateStream(activity_id=activity_id, sample_count=sample_count, data=data))
+    return sample_count
+
+# Réglages cardio d'un utilisateur utilisés par les analyses
+HrSettings = namedtuple("HrSettings", ["zone_bounds", "resting_hr", "max_hr"])
+
+def get_hr_settings(user_id):
+    profile = HeartRateProfile.query.filter_by(user_id=user_id).first()
+    if not profile:
+        return HrSettings(DEFAULT_ZONE_BOUNDS, DEFAULT_RESTING_HR, DEFAULT_MAX_HR)
+    return HrSettings(profile.bounds(), profile.resting_hr or DEFAULT_RESTING_HR, profile.max_hr or DEFAULT_MAX_HR)
+
+def save_hr_summary(activity_id, hr_values, time_values, settings, summary=None):
+    result = hr_summary(hr_values, time_values, settings.zone_bounds)
+    load = trimp(hr_values, time_values, settings.resting_hr, settings.max_hr) if result else None
+    return store_hr_summary(activity_id, result, load, summary)
+
+def store_hr_summary(activity_id, result, load, summary=None):
+    if result is None:
+        if summary:
+            db.session.delete(summary)
+        return None
+
+    if summary is None:
+        summary = HeartRateSummary(activity_id=activity_id)
+        db.session.add(summary)
+    summary.duration = result["duration"]
+    summary.avg_hr = result["avg_hr"]
+    summary.max_hr = result["max_hr"]
+    summary.hr_drift = result["hr_drift"]
+    summary.zone1, summary.zone2, summary.zone3, summary.zone4, summary.zone5 = result["time_in_zone"]
+    summary.trimp = load
+    return summary
+
+def add_training_load(user_id, day, load):
+    # Ajoute la TRIMP d'une activité à son jour
+    add_training_loads(user_id, {day: load})
+
+def add_training_loads(user_id, loads):
+    # Ajoute des TRIMP (jour -> charge), puis ré-enchaîne une seule fois les jours
+    # stockés à partir du plus ancien touché (en synchro normale : aucun, c'est le dernier)
+    if not loads:
+        return
+    first = min(loads)
+    previous = TrainingLoadDay.query.filter(
+        TrainingLoadDay.user_id == user_id, TrainingLoadDay.day < first
+    ).order_by(TrainingLoadDay.day.desc()).first()
+    by_day = {row.day: row for row in TrainingLoadDay.query.filter(
+        TrainingLoadDay.user_id == user_id, TrainingLoadDay.day >= first
+    )}
+
+    for day, load in loads.items():
+        if day not in by_day:
+            by_day[day] = TrainingLoadDay(user_id=user_id, day=day, trimp=0.0, atl=0.0, ctl=0.0)
+            db.session.add(by_day[day])
+        by_day[day].trimp += load
+    following = sorted(by_day.values(), key=lambda row: row.day)
+
+    start = (previous.day, previous.atl, previous.ctl) if previous else None
+    for row, (_, _, atl, ctl) in zip(following, chain(start, [(row.day, row.trimp) for row in following])):
+        row.atl, row.ctl = atl, ctl
+
+def rebuild_training_load(user_id):
+    # Repart des TRIMP stockées par activité (changement de FC repos/max...)
+    TrainingLoadDay.query.filter_by(user_id=user_id).delete()
+    loads = {}
+    rows = db.session.query(StravaActivity.start_date, HeartRateSummary.trimp).join(
+        HeartRateSummary, HeartRateSummary.activity_id == StravaActivity.id
+    ).filter(StravaActivity.user_id == user_id, StravaActivity.start_date.isnot(None), HeartRateSummary.trimp.isnot(None))
+    for start_date, load in rows:
+        loads[start_date.date()] = loads.get(start_date.date(), 0.0) + load
+    db.session.add_all(
+        TrainingLoadDay(user_id=user_id, day=day, trimp=load, atl=atl, ctl=ctl)
+        for day, load, atl, ctl in chain(None, sorted(loads.items()))
+    )
+
+def recompute_hr_summaries(user_id):
+    # Lancé en arrière-plan quand l'utilisateur change ses réglages cardio. Sous
+    # le verrou des jobs de synchro : la charge est entièrement réécrite, un
+    # add_training_load concurrent travaillerait sur des lignes supprimées.
+    with app.app_context(), _sync_job_lock(user_id):
+        settings = get_hr_settings(user_id)
+        activity_ids = [
+            activity_id for (activity_id,) in
+            db.session.query(StravaActivity.id).filter_by(user_id=user_id).order_by(StravaActivity.id)
+        ]
+        for i in range(0, len(activity_ids), 100):
+            batch = activity_ids[i:i + 100]
+            summaries = {
+                summary.activity_id: summary for summary in
+                HeartRateSummary.query.filter(HeartRateSummary.activity_id.in_(batch))
+            }
+            for stream in HeartRateStream.query.filter(HeartRateStream.activity_id.in_(batch)):
+                save_hr_summary(stream.activity_id, *stream.arrays(), settings, summaries.get(stream.activity_id))
+            db.session.commit()
+
+        rebuild_training_load(user_id)
+        bump_data_version(user_id)
         db.session.commit()
 
-    # Appel à l’API Strava pour récupérer les activités
-    headers = {"Authorization": f"Bearer {token.access_token}"}
-    activities_url = "https://www.strava.com/api/v3/athlete/activities"
-    params = {"per_page": 5, "page": 1}
-    response = requests.get(activities_url, headers=headers, params=params)
+@app.cli.command("rebuild-hr-streams")
+@click.option("--offline", is_flag=True, help="N'utilise que le cache disque, aucun appel à Strava")
+def rebuild_hr_streams(offline):
+    # Réécrit les streams cardio des activités Strava depuis le cache disque
+    # (Strava pour celles qui n'y sont pas, sauf --offline), puis analyses et charge
+    user_ids = [user_id for (user_id,) in db.session.query(StravaActivity.user_id).filter(
+        StravaActivity.source == "strava", StravaActivity.strava_id.isnot(None)
+    ).distinct()]
+    rebuilt = missing = 0
+    for user_id in user_ids:
+        client = None
+        if not offline:
+            try:
+                client = StravaClient(get_strava_access_token(user_id), cache=stream_cache)
+            except StravaTokenError:
+                pass
+        activities = dict(db.session.query(StravaActivity.strava_id, StravaActivity.id).filter(
+            StravaActivity.user_id == user_id, StravaActivity.source == "strava", StravaActivity.strava_id.isnot(None)
+        ))
+        strava_ids = list(activities)
+        for i in range(0, len(strava_ids), 100):
+            batch = strava_ids[i:i + 100]
+            if client:
+                streams = client.fetch_streams(batch, STRAVA_STREAM_KEYS)
+            else:
+                streams = ((strava_id, stream_cache.get(strava_id, STRAVA_STREAM_KEYS) if stream_cache else None)
+                           for strava_id in batch)
+            for strava_id, hr_stream in streams:
+                if hr_stream and "heart_rate" in hr_stream and "time" in hr_stream:
+                    save_hr_stream(activities[strava_id], hr_stream["heart_rate"]["data"], hr_stream["time"]["data"])
+                    rebuilt += 1
+                else:
+                    missing += 1
+            db.session.commit()
+        recompute_hr_summaries(user_id)
+    print(f"{rebuilt} stream(s) réécrit(s), {missing} absent(s) pour {len(user_ids)} utilisateur(s)")
+
+@app.cli.command("rebuild-training-load")
+def rebuild_training_load_command():
+    # Recalcule analyses cardio (dont la TRIMP) et charge de tous les utilisateurs
+    user_ids = [user_id for (user_id,) in db.session.query(User.id)]
+    for user_id in user_ids:
+        recompute_hr_summaries(user_id)
+    print(f"Charge d'entraînement recalculée pour {len(user_ids)} utilisateur(s)")
+
+def merge_pr_best(pending, user_id, record):
+    # Agrège un PR dans pending[(exo_id, pr)] avant update_pr_best
+    key = (record["exo_id"], record["pr"])
+    best = pending.get(key)
+    if best is None:
+        best = pending[key] = PersonalRecordBest(user_id=user_id, exo_id=key[0], pr=key[1], record_count=0)
+    best.merge(pr_score(record["pr"], record), record["date"])
+
+def update_pr_best(user_id, pending):
+    # Fusionne les agrégats avec les lignes existantes (une seule lecture)
+    if not pending:
+        return
+    existing = {
+        (best.exo_id, best.pr): best for best in
+        PersonalRecordBest.query.filter(
+            PersonalRecordBest.user_id == user_id,
+            PersonalRecordBest.exo_id.in_({exo_id for exo_id, _ in pending})
+        )
+    }
+    for key, new in pending.items():
+        best = existing.get(key)
+        if best is None:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(new)
+                continue
+            except IntegrityError:
+                # Premier PR de cette clé inséré en même temps par une autre requête
+                best = PersonalRecordBest.query.filter_by(user_id=user_id, exo_id=key[0], pr=key[1]).one()
+        best.merge(new.best_value, new.best_date, new.record_count)
+
+def recompute_pr_best(user_id, exo_id, pr):
+    # Après une suppression : seule la clé touchée est relue (index user/exo/pr/date)
+    best = PersonalRecordBest.query.filter_by(user_id=user_id, exo_id=exo_id, pr=pr).first()
+    if best is None:
+        best = PersonalRecordBest(user_id=user_id, exo_id=exo_id, pr=pr)
+        db.session.add(best)
+    best.best_value = best.best_date = None
+    best.record_count = 0
+    records = db.session.query(Personal_record.added_weight, Personal_record.quantity, Personal_record.time, Personal_record.date).filter_by(user_id=user_id, exo_id=exo_id, pr=pr)
+    for record in records:
+        best.merge(pr_score(pr, record), record.date)
+    if not best.record_count:
+        db.session.delete(best)
+
+@app.cli.command("rebuild-pr-best")
+def rebuild_pr_best():
+    # Recalcule toute la table en cas de dérive (import SQL direct, bug...)
+    PersonalRecordBest.query.delete()
+    pending = {}
+    count = 0
+    records = db.session.query(
+        Personal_record.user_id, Personal_record.exo_id, Personal_record.pr, Personal_record.added_weight,
+        Personal_record.quantity, Personal_record.time, Personal_record.date
+    ).yield_per(1000)
+    for record in records:
+        merge_pr_best(pending, record.user_id, record._asdict())
+        count += 1
+    db.session.add_all(pending.values())
+    db.session.commit()
+    print(f"{len(pending)} meilleurs PR recalculés depuis {count} PR")
+
+class StravaTokenError(Exception):
+    pass
+
+class StravaTokenRevoked(StravaTokenError):
+    # Strava refuse le refresh_token : l'utilisateur a retiré l'accès à l'app
+    pass
+
+# user_id -> (access_token, expires_at) : les appels suivants n'interrogent pas la base
+strava_token_cache = {}
+_strava_refresh_locks = {}
+_strava_refresh_locks_guard = threading.Lock()
+
+def _strava_refresh_lock(user_id):
+    with _strava_refresh_locks_guard:
+        return _strava_refresh_locks.setdefault(user_id, threading.Lock())
 
+def _refresh_strava_token(session, token):
+    response = request_token({
+        "client_id": STRAVA_CLIENT_ID,
+        "client_secret": STRAVA_CLIENT_SECRET,
+        "grant_type": "refresh_token",
+        "refresh_token": token.refresh_token
+    })
+    if response.status_code in (400, 401):
+        raise StravaTokenRevoked("Accès Strava révoqué")
     if response.status_code != 200:
-        return {"message": "Erreur API Strava"}, 400
+        raise StravaTokenError("Erreur lors du refresh du token")
+
+    new_tokens = response.json()
+    token.access_token = new_tokens["access_token"]
+    token.refresh_token = new_tokens["refresh_token"]
+    token.expires_at = new_tokens["expires_at"]
+    token.refresh_lease_until = None
+    session.commit()
+
+def get_strava_access_token(user_id):
+    # Renouvelle le token un peu avant son expiration, une seule fois pour
+    # tous les workers : Strava invalide l'ancien refresh_token à chaque refresh,
+    # deux refresh concurrents feraient donc écrire un token déjà mort.
+    cached = strava_token_cache.get(user_id)
+    if cached and cached[1] - STRAVA_TOKEN_MARGIN > time.time():
+        return cached[0]
+
+    with _strava_refresh_lock(user_id):
+        deadline = time.time() + STRAVA_REFRESH_WAIT
+        while True:
+            # Session à part : on relit toujours la dernière version de la ligne
+            with Session(db.engine) as session:
+                token = session.query(StravaToken).filter_by(user_id=user_id).first()
+                if not token:
+                    raise StravaTokenError("Token Strava manquant")
+
+                now = time.time()
+                if token.expires_at - STRAVA_TOKEN_MARGIN > now:
+                    strava_token_cache[user_id] = (token.access_token, token.expires_at)
+                    return token.access_token
+
+                # Bail sur la ligne : seul le process qui le prend appelle Strava
+                acquired = session.execute(
+                    update(StravaToken)
+                    .where(StravaToken.id == token.id)
+                    .where(or_(StravaToken.refresh_lease_until.is_(None), StravaToken.refresh_lease_until < now))
+                    .values(refresh_lease_until=int(now) + STRAVA_REFRESH_LEASE)
+                ).rowcount == 1
+                session.commit()
+
+                if acquired:
+                    try:
+                        _refresh_strava_token(session, token)
+                    except (StravaTokenError, requests.RequestException) as e:
+                        session.rollback()
+                        session.execute(update(StravaToken).where(StravaToken.id == token.id).values(refresh_lease_until=None))
+                        session.commit()
+                        if isinstance(e, StravaTokenRevoked):
+                            raise
+                        # Le token actuel reste utilisable jusqu'à son expiration réelle
+                        if token.expires_at > time.time():
+                            return token.access_token
+                        raise StravaTokenError("Erreur lors du refresh du token")
+                    strava_token_cache[user_id] = (token.access_token, token.expires_at)
+                    return token.access_token
+
+            # Un autre process est en train de rafraîchir : on attend son résultat
+            if time.time() > deadline:
+                raise StravaTokenError("Refresh du token Strava toujours en cours, réessayer plus tard")
+            time.sleep(0.2)
+
+def parse_pr_date(value):
+    if value in (None, ""):
+        return None
+    if not isinstance(value, str):
+        raise ValueError(value)
+    return datetime.date.fromisoformat(value)
+
+def parse_duration(value):
+    # Durée en secondes : 95, "95", "1:35" ou "1:01:35"
+    if value in (None, ""):
+        return None
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, (int, float)):
+        return int(value)
+    seconds = 0
+    for part in str(value).split(":"):
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+def parse_number(value):
+    # Les lignes CSV arrivent en texte : "12" -> 12, "2.5" -> 2.5, "" -> None
+    if value in (None, ""):
+        return None
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, (int, float)):
+        return value
+    value = str(value).strip()
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+PR_FIELDS = ["exo_id", "pr", "quantity", "time", "added_weight", "date", "weight"]
+
+def personal_record_values(data):
+    # Validation commune à l'ajout unitaire et à l'import : renvoie les colonnes
+    # du PR (sans user_id) ou lève ValueError avec le message pour le client
+    if not isinstance(data, dict) or not all(key in data for key in PR_FIELDS):
+        raise ValueError("Données invalides; champs manquants")
+    try:
+        date = parse_pr_date(data["date"])
+        duration = parse_duration(data["time"])
+    except ValueError:
+        raise ValueError("Données invalides; date (AAAA-MM-JJ) ou temps incorrect")
+    try:
+        exo_id = int(data["exo_id"])
+        quantity = parse_number(data["quantity"])
+        added_weight = parse_number(data["added_weight"])
+        weight = parse_number(data["weight"])
+    except (TypeError, ValueError):
+        raise ValueError("Données invalides; nombre incorrect")
+
+    if weight is not None and added_weight is not None:
+        if not weight:
+            raise ValueError("Données invalides; poids nul")
+        bodyweight = round((weight+added_weight)/weight,3)*100
+    else:
+        bodyweight = None
+
+    return {
+        "exo_id": exo_id, "pr": data["pr"], "quantity": quantity, "time": duration,
+        "added_weight": added_weight, "date": date, "weight": weight, "bodyweight": bodyweight,
+    }
+
+def strava_epoch(start_date):
+    # "2025-05-10T07:30:00Z" -> timestamp UTC
+    return int(datetime.datetime.strptime(start_date, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=datetime.timezone.utc).timestamp())
+
+def strava_activity_fields(act):
+    # Colonnes de StravaActivity tirées d'un élément de /athlete/activities
+    start_date = act.get("start_date")
+    max_hr = act.get("max_heartrate")
+    return {
+        "start_date": datetime.datetime.utcfromtimestamp(strava_epoch(start_date)) if start_date else None,
+        "name": act["name"][:255] if act.get("name") else None,
+        "sport_type": act.get("sport_type") or act.get("type"),
+        "elapsed_time": act.get("elapsed_time"),
+        "moving_time": act.get("moving_time"),
+        "distance": act.get("distance"),
+        "avg_hr": act.get("average_heartrate"),
+        "max_hr": int(max_hr) if max_hr is not None else None,
+    }
 
-    activities = response.json()
-    nombre_activite=len(activities)
-    for act in activities:
-        # Ne stocke que les nouvelles activités
-        if not StravaActivity.query.filter_by(strava_id=act["id"]).first():
+def store_strava_activities(client, user_id, activities, job=None):
+    # Une seule requête IN pour savoir quelles activités de la page sont nouvelles
+    ids = [act["id"] for act in activities]
+    existing = {
+        strava_id for (strava_id,) in
+        db.session.query(StravaActivity.strava_id).filter(StravaActivity.strava_id.in_(ids))
+    } if ids else set()
+    new_ids = [strava_id for strava_id in ids if strava_id not in existing]
+    by_id = {act["id"]: act for act in activities}
+    settings = get_hr_settings(user_id) if new_ids else None
+
+    # Activités déjà connues (renommées, ou synchronisées avant qu'on garde le
+    # résumé) : mise à jour groupée, sans retélécharger les streams
+    if existing:
+        rows = db.session.query(
+            StravaActivity.id, StravaActivity.strava_id, StravaActivity.start_date, HeartRateSummary.trimp
+        ).outerjoin(HeartRateSummary, HeartRateSummary.activity_id == StravaActivity.id).filter(
+            StravaActivity.user_id == user_id, StravaActivity.strava_id.in_(existing)
+        ).all()
+        if rows:
+            values = [{"id": row.id, **strava_activity_fields(by_id[row.strava_id])} for row in rows]
+            db.session.execute(update(StravaActivity), values)
+            # Date de début reçue pour la première fois (activités antérieures à la
+            # colonne) ou modifiée : la TRIMP de l'activité passe au bon jour
+            loads = {}
+            for row, fields in zip(rows, values):
+                old_day = row.start_date.date() if row.start_date else None
+                new_day = fields["start_date"].date() if fields["start_date"] else None
+                if row.trimp is not None and old_day != new_day:
+                    if old_day:
+                        loads[old_day] = loads.get(old_day, 0.0) - row.trimp
+                    if new_day:
+                        loads[new_day] = loads.get(new_day, 0.0) + row.trimp
+            add_training_loads(user_id, loads)
+            bump_data_version(user_id)
+            db.session.commit()
+    if job:
+        job.activities_found += len(new_ids)
+        db.session.commit()
+
+    # Les streams sont téléchargés en parallèle, les écritures restent ici
+    for strava_id, hr_stream in client.fetch_streams(new_ids, STRAVA_STREAM_KEYS):
+        with span("strava.store_activity", user_id=user_id, strava_id=strava_id) as fields:
             new_act = StravaActivity(
-                strava_id=act["id"],
-                user_id=current_user.id,
+                strava_id=strava_id,
+                user_id=user_id,
+                **strava_activity_fields(by_id[strava_id])
             )
             db.session.add(new_act)
             db.session.flush() # pour obtenir new_act.id avant le commit
-            print("activité ajoutée à StravaActivity")
-
-            activity_id = act["id"]
-            hr_stream_url = f"https://www.strava.com/api/v3/activities/{activity_id}/streams"
-            hr_params = {"keys": "heart_rate,time", "key_by_type": "true"}
-            hr_response = requests.get(hr_stream_url, headers=headers, params=hr_params)
-
-            if hr_response.status_code == 200:
-                hr_stream = hr_response.json()
-                print(hr_stream.keys())
-                if "heart_rate" in hr_stream and "time" in hr_stream:
-                    print("hr_stream reçu")
-                    hr_values = hr_stream["heart_rate"]["data"]
-                    time_values = hr_stream["time"]["data"]
-                    for hr, t in zip(hr_values, time_values):
-                        sample = HeartRateSample(
-                            activity_id=new_act.id,
-                            hr=hr,
-                            time=t
-                        )
-                        db.session.add(sample)
-                    print("samples ajoutés")
 
-    db.session.commit()
+            fields["samples"] = 0
+            if hr_stream and "heart_rate" in hr_stream and "time" in hr_stream:
+                hr_values = hr_stream["heart_rate"]["data"]
+                time_values = hr_stream["time"]["data"]
+                nb_samples = save_hr_stream(new_act.id, hr_values, time_values)
+                summary = save_hr_summary(new_act.id, hr_values, time_values, settings)
+                if summary and summary.trimp is not None and new_act.start_date:
+                    add_training_load(user_id, new_act.start_date.date(), summary.trimp)
+                fields["samples"] = nb_samples
+                if job:
+                    job.streams_fetched += 1
+                    job.samples_written += nb_samples
+
+            # Une transaction par activité : l'activité et ses samples sont écrits ensemble
+            bump_data_version(user_id)
+            db.session.commit()
+
+    return len(new_ids)
+
+def fetch_strava_activities(current_user, job=None, budget=None):
+    token = StravaToken.query.filter_by(user_id=current_user.id).first()
+
+    if not token:
+        return {"message": "Token Strava manquant"}, 400
+
+    try:
+        access_token = get_strava_access_token(current_user.id)
+    except StravaTokenError as e:
+        return {"message": str(e)}, 400
+
+    # Appel à l’API Strava : toutes les pages depuis le curseur. Avec "after",
+    # Strava renvoie les activités de la plus ancienne à la plus récente, donc
+    # le curseur peut avancer page par page sans risquer de trou.
+    client = StravaClient(access_token, limiter=budget, cache=stream_cache)
+    after = token.sync_cursor or 0
+    page = 1
+    nombre_activite = 0
+    try:
+        with span("strava.sync", user_id=current_user.id, after=after) as sync_fields:
+            while True:
+                with span("strava.sync_page", user_id=current_user.id, page=page) as fields:
+                    params = {"per_page": STRAVA_PAGE_SIZE, "page": page, "after": after}
+                    response = client.get("/athlete/activities", params)
+                    if response.status_code != 200:
+                        return {"message": "Erreur API Strava"}, 400
+
+                    activities = response.json()
+                    new_activities = store_strava_activities(client, current_user.id, activities, job)
+                    nombre_activite += new_activities
+                    fields.update(activities=len(activities), new=new_activities)
+
+                    if activities:
+                        token.sync_cursor = max(token.sync_cursor or 0, max(strava_epoch(act["start_date"]) for act in activities))
+                        db.session.commit()
+                if len(activities) < STRAVA_PAGE_SIZE:
+                    break
+                page += 1
+            sync_fields.update(pages=page, new=nombre_activite)
+        token.last_synced_at = datetime.datetime.utcnow()
+        db.session.commit()
+    except BudgetExhausted:
+        # Pas une erreur : le curseur a avancé, le prochain passage reprend la suite
+        return {
+            "message": "Budget de synchro atteint, reprise au prochain passage",
+            "nombres d'activités": nombre_activite
+        }
+    except RateLimitExceeded:
+        return {"message": "Quota Strava épuisé, réessayer plus tard"}, 429
+    except (StravaError, requests.RequestException):
+        return {"message": "Erreur API Strava"}, 400
+
     return {
         "message": "Activités Strava mises à jour",
         "nombres d'activités": nombre_activite
     }
 
+@app.cli.command("strava-resync-metadata")
+def strava_resync_metadata():
+    # La prochaine synchro de chaque utilisateur reparcourt tout son historique :
+    # les activités connues reçoivent leur résumé, les streams ne sont pas retéléchargés
+    count = StravaToken.query.update({"sync_cursor": None})
+    db.session.commit()
+    print(f"Curseur de synchro remis à zéro pour {count} utilisateur(s)")
+
+# Worker de synchro dans le process : la requête HTTP ne fait qu'insérer le job
+sync_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SYNC_WORKERS", "2")), thread_name_prefix="strava-sync")
+
+# Jobs portés par ce process, en file ou en cours : un thread rafraîchit leur heartbeat_at
+_live_sync_jobs = set()
+_live_sync_jobs_guard = threading.Lock()
+_sync_heartbeat_thread = None
+_stale_sync_jobs_checked = False
+
+def _sync_heartbeat():
+    while True:
+        time.sleep(SYNC_JOB_HEARTBEAT.total_seconds())
+        with _live_sync_jobs_guard:
+            job_ids = list(_live_sync_jobs)
+        if not job_ids:
+            continue
+        try:
+            with app.app_context(), Session(db.engine) as session:
+                session.execute(update(SyncJob).where(SyncJob.id.in_(job_ids)).values(heartbeat_at=datetime.datetime.utcnow()))
+                session.commit()
+        except OperationalError:
+            pass  # base verrouillée : le prochain battement suffit, SYNC_JOB_STALE laisse de la marge
+
+def track_sync_job(job_id):
+    global _sync_heartbeat_thread
+    with _live_sync_jobs_guard:
+        _live_sync_jobs.add(job_id)
+        if _sync_heartbeat_thread is None:
+            _sync_heartbeat_thread = threading.Thread(target=_sync_heartbeat, name="strava-sync-heartbeat", daemon=True)
+            _sync_heartbeat_thread.start()
+
+def untrack_sync_job(job_id):
+    with _live_sync_jobs_guard:
+        _live_sync_jobs.discard(job_id)
+
+def submit_sync_job(job_id):
+    track_sync_job(job_id)
+    sync_executor.submit(run_sync_job, job_id)
+
+def pending_sync_job(user_id, kind="sync", strava_id=None):
+    # Seuls comptent les jobs dont le process donne encore signe de vie
+    cutoff = datetime.datetime.utcnow() - SYNC_JOB_STALE
+    pending = ["queued", "running"] if kind == "sync" else ["queued"]
+    return SyncJob.query.filter(
+        SyncJob.user_id == user_id,
+        SyncJob.kind == kind,
+        SyncJob.strava_id.is_(None) if strava_id is None else SyncJob.strava_id == strava_id,
+        SyncJob.status.in_(pending),
+        SyncJob.heartbeat_at > cutoff
+    ).order_by(SyncJob.id.desc()).first()
+
+def enqueue_sync_job(user_id, kind="sync", strava_id=None):
+    # Un job identique déjà en cours pour cet utilisateur suffit. Un job
+    # d'activité attend qu'il ne soit plus "queued" : un événement reçu
+    # pendant qu'il tourne relance une lecture à jour.
+    job = pending_sync_job(user_id, kind, strava_id)
+    if job:
+        return job
+
+    job = SyncJob(user_id=user_id, kind=kind, strava_id=strava_id)
+    db.session.add(job)
+    db.session.commit()
+    submit_sync_job(job.id)
+    return job
+
+def recover_sync_jobs():
+    # Jobs restés "queued"/"running" après l'arrêt de leur worker (redémarrage
+    # gunicorn, déploiement) : relancés ici, ou abandonnés s'ils sont trop vieux.
+    # La reprise passe par un UPDATE conditionnel : un seul process la gagne.
+    now = datetime.datetime.utcnow()
+    stale = or_(SyncJob.heartbeat_at.is_(None), SyncJob.heartbeat_at < now - SYNC_JOB_STALE)
+    jobs = db.session.query(SyncJob.id, SyncJob.created_at).filter(SyncJob.status.in_(["queued", "running"]), stale).all()
+    recovered = []
+    for job_id, created_at in jobs:
+        expired = created_at < now - SYNC_JOB_TIMEOUT
+        values = {"status": "failed", "message": "Job perdu (worker arrêté)", "finished_at": now} if expired \
+            else {"status": "queued", "message": "Relancé après l'arrêt de son worker", "heartbeat_at": now}
+        claimed = db.session.execute(
+            update(SyncJob).where(SyncJob.id == job_id, SyncJob.status.in_(["queued", "running"]), stale).values(**values)
+        ).rowcount == 1
+        db.session.commit()
+        if claimed and not expired:
+            submit_sync_job(job_id)
+            recovered.append(job_id)
+    return recovered
+
+@app.before_request
+def recover_sync_jobs_once():
+    # Au premier appel reçu par le process (pas à l'import : les commandes
+    # "flask db" tournent avant que la colonne heartbeat_at n'existe)
+    global _stale_sync_jobs_checked
+    if _stale_sync_jobs_checked:
+        return
+    _stale_sync_jobs_checked = True
+    try:
+        recover_sync_jobs()
+    except OperationalError:
+        db.session.rollback()
+        _stale_sync_jobs_checked = False
+
+def fetch_strava_activity(current_user, strava_id, job=None, budget=None):
+    # Création ou modification d'une activité (webhook) : son résumé, et son
+    # stream si elle est nouvelle ; rien d'autre n'est listé
+    try:
+        access_token = get_strava_access_token(current_user.id)
+    except StravaTokenError as e:
+        return {"message": str(e)}, 400
+
+    client = StravaClient(access_token, limiter=budget, cache=stream_cache)
+    try:
+        response = client.get(f"/activities/{strava_id}")
+        if response.status_code == 404:
+            # Devenue privée ou supprimée entre-temps
+            return delete_strava_activity(current_user, strava_id, job)
+        if response.status_code != 200:
+            return {"message": "Erreur API Strava"}, 400
+        new_activities = store_strava_activities(client, current_user.id, [response.json()], job)
+    except (RateLimitExceeded, BudgetExhausted):
+        return {"message": "Quota Strava épuisé, réessayer plus tard"}, 429
+    except (StravaError, requests.RequestException):
+        return {"message": "Erreur API Strava"}, 400
+
+    return {"message": "Activité ajoutée" if new_activities else "Activité mise à jour"}
+
+def confirm_strava_activity_deleted(current_user, strava_id, job=None, budget=None):
+    # Les événements du webhook ne sont pas signés : une activité n'est supprimée
+    # que si Strava ne la connaît plus (404, voir fetch_strava_activity) ; sinon
+    # elle est simplement remise à jour
+    if not StravaActivity.query.filter_by(user_id=current_user.id, strava_id=strava_id).first():
+        return {"message": "Activité inconnue, rien à supprimer"}
+    return fetch_strava_activity(current_user, strava_id, job, budget)
+
+def strava_access_revoked(user_id, budget=None):
+    # Même vérification pour une révocation : le refresh du token est refusé, ou
+    # l'API répond 401 avec le token actuel
+    try:
+        access_token = get_strava_access_token(user_id)
+    except StravaTokenRevoked:
+        return True
+    return StravaClient(access_token, limiter=budget).get("/athlete").status_code == 401
+
+def revoke_strava_access(current_user, budget=None):
+    try:
+        revoked = strava_access_revoked(current_user.id, budget)
+    except (StravaTokenError, StravaError, requests.RequestException):
+        return {"message": "Révocation non vérifiable auprès de Strava, token conservé"}, 400
+    if not revoked:
+        return {"message": "Accès Strava toujours valide, révocation ignorée"}, 400
+
+    strava_token_cache.pop(current_user.id, None)
+    StravaToken.query.filter_by(user_id=current_user.id).delete()
+    db.session.commit()
+    # Les réponses brutes de Strava ne sont plus à nous : le cache disque est purgé
+    if stream_cache:
+        strava_ids = db.session.query(StravaActivity.strava_id).filter(
+            StravaActivity.user_id == current_user.id, StravaActivity.strava_id.is_not(None))
+        for (strava_id,) in strava_ids:
+            stream_cache.delete(strava_id, STRAVA_STREAM_KEYS)
+    return {"message": "Accès Strava révoqué"}
+
+def delete_strava_activity(current_user, strava_id, job=None):
+    activity = StravaActivity.query.filter_by(user_id=current_user.id, strava_id=strava_id).first()
+    if not activity:
+        return {"message": "Activité inconnue, rien à supprimer"}
+
+    # Le stream brut en cache disque part avec l'activité
+    if stream_cache:
+        stream_cache.delete(strava_id, STRAVA_STREAM_KEYS)
+
+    summary = activity.hr_summary
+    if summary and summary.trimp is not None and activity.start_date:
+        add_training_load(current_user.id, activity.start_date.date(), -summary.trimp)
+    HeartRateSummary.query.filter_by(activity_id=activity.id).delete()
+    HeartRateStream.query.filter_by(activity_id=activity.id).delete()
+    db.session.delete(activity)
+    bump_data_version(current_user.id)
+    db.session.commit()
+    return {"message": "Activité supprimée"}
+
+# Les jobs d'un même utilisateur passent un par un (création puis suppression
+# d'une même activité, webhook pendant une synchro complète...)
+_sync_job_locks = {}
+_sync_job_locks_guard = threading.Lock()
+
+def _sync_job_lock(user_id):
+    with _sync_job_locks_guard:
+        return _sync_job_locks.setdefault(user_id, threading.Lock())
+
+def run_sync_job(job_id):
+    try:
+        with app.app_context():
+            job = db.session.get(SyncJob, job_id)
+            with _sync_job_lock(job.user_id):
+                _run_sync_job(job)
+    finally:
+        untrack_sync_job(job_id)
+
+def _run_sync_job(job):
+    job.status = "running"
+    job.started_at = job.heartbeat_at = datetime.datetime.utcnow()
+    db.session.commit()
+    budget = RequestBudget(job.request_budget)
+    try:
+        if job.kind == "activity":
+            result = fetch_strava_activity(job.user, job.strava_id, job, budget)
+        elif job.kind == "delete":
+            result = confirm_strava_activity_deleted(job.user, job.strava_id, job, budget)
+        elif job.kind == "deauthorize":
+            result = revoke_strava_access(job.user, budget)
+        else:
+            result = fetch_strava_activities(job.user, job, budget)
+        if isinstance(result, tuple):
+            job.status = "failed"
+            result = result[0]
+        else:
+            job.status = "done"
+        job.message = result["message"]
+    except Exception as e:
+        db.session.rollback()
+        job.status = "failed"
+        job.message = f"Erreur : {str(e)}"[:255]
+    job.requests_used = budget.used
+    job.finished_at = datetime.datetime.utcnow()
+    db.session.commit()
+
+def sync_round_budget(interval=STRAVA_SYNC_INTERVAL):
+    # Part du quota de l'app pour un passage : ce qui reste dans la fenêtre de
+    # 15 min, sans dépasser le quota du jour réparti sur les passages d'ici minuit UTC
+    short, daily = rate_limiter.headroom()
+    rounds_left = max(1, math.ceil(rate_limiter.seconds_until_daily_reset() / interval))
+    return min(short, daily // rounds_left)
+
+def strava_sync_status(user_id=None):
+    # Par compte Strava : retard depuis la dernière synchro complète et
+    # consommation du dernier job de synchro
+    now = datetime.datetime.utcnow()
+    last_jobs = db.session.query(db.func.max(SyncJob.id)).filter(SyncJob.kind == "sync").group_by(SyncJob.user_id)
+    tokens = StravaToken.query
+    if user_id is not None:
+        tokens = tokens.filter_by(user_id=user_id)
+        last_jobs = last_jobs.filter(SyncJob.user_id == user_id)
+    jobs = {job.user_id: job for job in SyncJob.query.filter(SyncJob.id.in_(last_jobs.scalar_subquery()))}
+    status = []
+    for token in tokens.order_by(StravaToken.user_id):
+        job = jobs.get(token.user_id)
+        status.append({
+            "user_id": token.user_id,
+            "last_synced_at": token.last_synced_at.isoformat() if token.last_synced_at else None,
+            "lag_seconds": round((now - token.last_synced_at).total_seconds()) if token.last_synced_at else None,
+            "last_job": job.to_dict() if job else None,
+        })
+    return status
+
+def sync_all_strava_accounts(interval=STRAVA_SYNC_INTERVAL, user_cap=STRAVA_SYNC_USER_CAP):
+    # Les comptes les moins récemment synchronisés passent d'abord. Chacun reçoit une
+    # part égale de ce qui reste du budget du passage, plafonnée à user_cap : ce qu'un
+    # compte à jour n'utilise pas revient aux suivants, et un gros rattrapage
+    # s'arrête à sa part pour reprendre au passage suivant.
+    tokens = StravaToken.query.order_by(
+        StravaToken.last_synced_at.is_not(None), StravaToken.last_synced_at, StravaToken.id
+    ).all()
+    budget = sync_round_budget(interval)
+    report = []
+    with span("strava.sync_all", users=len(tokens), budget=budget) as fields:
+        for i, token in enumerate(tokens):
+            share = min(user_cap, budget // (len(tokens) - i))
+            entry = {"user_id": token.user_id, "budget": share, "used": 0}
+            if share <= 0:
+                entry["status"] = "skipped"
+            elif pending_sync_job(token.user_id):
+                # Synchro déjà lancée à la main ou par un autre process
+                entry["status"] = "busy"
+            else:
+                job = SyncJob(user_id=token.user_id, kind="sync", request_budget=share)
+                db.session.add(job)
+                db.session.commit()
+                track_sync_job(job.id)
+                try:
+                    with _sync_job_lock(token.user_id):
+                        _run_sync_job(job)
+                finally:
+                    untrack_sync_job(job.id)
+                budget -= job.requests_used
+                entry.update(status=job.status, used=job.requests_used, message=job.message)
+            report.append(entry)
+        fields["used"] = sum(entry["used"] for entry in report)
+    return report
+
+@app.cli.command("strava-sync-all")
+@click.option("--every", type=int, default=0, help="Relance un passage toutes les N secondes")
+@click.option("--user-cap", type=int, default=STRAVA_SYNC_USER_CAP, help="Requêtes max par utilisateur et par passage")
+def strava_sync_all(every, user_cap):
+    while True:
+        started = time.monotonic()
+        report = sync_all_strava_accounts(every or STRAVA_SYNC_INTERVAL, user_cap)
+        lags = {status["user_id"]: status["lag_seconds"] for status in strava_sync_status()}
+        for entry in report:
+            lag = lags.get(entry["user_id"])
+            print(f"user {entry['user_id']:>5} {entry['status']:<8} requêtes {entry['used']:>4}/{entry['budget']:<4} "
+                  f"retard {'-' if lag is None else f'{lag} s'}")
+        if not every:
+            break
+        time.sleep(max(0, every - (time.monotonic() - started)))
+
+def _strava_sync_lag():
+    return {(status["user_id"],): status["lag_seconds"]
+            for status in strava_sync_status() if status["lag_seconds"] is not None}
+
+def _strava_sync_requests():
+    values = {}
+    for status in strava_sync_status():
+        job = status["last_job"]
+        if job:
+            values[(status["user_id"], "used")] = job["requests_used"]
+            if job["request_budget"] is not None:
+                values[(status["user_id"], "budget")] = job["request_budget"]
+    return values
+
+metrics.register(metrics.Gauge(
+    "strava_sync_lag_seconds", "Temps écoulé depuis la dernière synchro Strava complète",
+    ("user_id",), _strava_sync_lag))
+metrics.register(metrics.Gauge(
+    "strava_sync_requests", "Budget et requêtes consommées par le dernier job de synchro",
+    ("user_id", "kind"), _strava_sync_requests))
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -224,19 +1345,68 @@ def login():
         return jsonify({"message": "Identifiants invalides"}), 401
 
     token = generate_token(user.id)
-    return jsonify({"message": "Connexion réussie", "token": token}), 200
+    refresh_token = issue_refresh_token(user.id)
+    db.session.commit()
+    return jsonify({"message": "Connexion réussie", "token": token, "refresh_token": refresh_token}), 200
+
+@app.route("/token/refresh", methods=["POST"])
+def refresh_access_token():
+    # Nouveau JWT sans repasser par le hash du mot de passe ; le refresh token
+    # présenté est remplacé par un nouveau (rotation)
+    data = request.get_json(silent=True) or {}
+    presented = data.get("refresh_token")
+    if not presented:
+        return jsonify({"message": "Refresh token manquant"}), 400
+
+    now = datetime.datetime.utcnow()
+    row = RefreshToken.query.filter_by(token_hash=hash_refresh_token(presented)).first()
+    if not row or row.expires_at <= now:
+        return jsonify({"message": "Refresh token invalide ou expiré"}), 401
+    if row.rotated_at is None and row.revoked_at is None:
+        # Marquage conditionnel : de deux requêtes concurrentes, une seule gagne
+        rotated = db.session.execute(
+            update(RefreshToken)
+            .where(RefreshToken.id == row.id, RefreshToken.rotated_at.is_(None), RefreshToken.revoked_at.is_(None))
+            .values(rotated_at=now)
+        ).rowcount
+        if rotated:
+            refresh_token = issue_refresh_token(row.user_id, row.family_id)
+            db.session.commit()
+            return jsonify({"token": generate_token(row.user_id), "refresh_token": refresh_token}), 200
+        db.session.rollback()
+        row = db.session.get(RefreshToken, row.id)
+
+    if row.revoked_at is None and row.rotated_at is not None and now - row.rotated_at > REFRESH_TOKEN_REUSE_GRACE:
+        # Token déjà remplacé présenté à nouveau : volé ou rejoué, on coupe la session
+        revoke_refresh_family(row.family_id)
+        db.session.commit()
+    return jsonify({"message": "Refresh token déjà utilisé ou révoqué"}), 401
+
+@app.route("/token/revoke", methods=["POST"])
+def revoke_refresh_token():
+    # Déconnexion : le token et tous ceux de la même connexion
+    data = request.get_json(silent=True) or {}
+    presented = data.get("refresh_token")
+    if not presented:
+        return jsonify({"message": "Refresh token manquant"}), 400
+    row = RefreshToken.query.filter_by(token_hash=hash_refresh_token(presented)).first()
+    if row:
+        revoke_refresh_family(row.family_id)
+        db.session.commit()
+    return jsonify({"message": "Session révoquée"}), 200
+
+@app.cli.command("purge-refresh-tokens")
+def purge_refresh_tokens():
+    count = RefreshToken.query.filter(RefreshToken.expires_at <= datetime.datetime.utcnow()).delete()
+    db.session.commit()
+    print(f"{count} refresh token(s) expiré(s) supprimé(s)")
 
 @app.route("/exo", methods=["GET"])
 def get_exo():
-    exo = Exo.query.all()
-    result = []
-
-    for i in exo:
-        result.append({
-            "id": i.id,
-            "name": i.name
-        })
-    return jsonify(result)    
+    return paginated_response(Exo.query, (Exo.id,), lambda i: {
+        "id": i.id,
+        "name": i.name
+    })
 
 @app.route("/exo", methods=["POST"])
 def add_exo():
@@ -244,6 +1414,8 @@ def add_exo():
     exo = Exo(name=data["name"])
 
     db.session.add(exo)
+    # Le catalogue d'exos est commun : toutes les listes changent
+    bump_data_version()
     db.session.commit()
     return jsonify({"message": "Exo ajouté avec succès."}), 201
 
@@ -253,40 +1425,165 @@ def personal_index():
 
 @app.route("/pr-types", methods=["GET"])
 @token_required
+@etag_by_data_version
 def get_pr_types(current_user):
-    pr_types = db.session.query(Personal_record.pr, Exo.name).filter_by(user_id=current_user.id).join(Personal_record.exo).distinct().all()
-    result = [
-        {"pr": pr, "exercise": exo_name}
-        for pr, exo_name in pr_types
-    ]
-    return jsonify(result)
+    pr_types = db.session.query(Personal_record.pr, Exo.id, Exo.name).filter_by(user_id=current_user.id).join(Personal_record.exo).distinct()
+    return paginated_response(pr_types, (Exo.id, Personal_record.pr), lambda row: {
+        "pr": row.pr,
+        "exo_id": row.id,
+        "exercise": row.name
+    })
+
+@app.route("/personal-records/best", methods=["GET"])
+@token_required
+@etag_by_data_version
+def get_best_personal_records(current_user):
+    # Vue d'ensemble "mes records" : lecture directe de la table résumé
+    bests = db.session.query(
+        PersonalRecordBest.exo_id, PersonalRecordBest.pr, PersonalRecordBest.best_value,
+        PersonalRecordBest.best_date, PersonalRecordBest.record_count, Exo.name
+    ).filter(PersonalRecordBest.user_id == current_user.id).join(PersonalRecordBest.exo)
+    return paginated_response(bests, (PersonalRecordBest.exo_id, PersonalRecordBest.pr), lambda row: {
+        "exo_id": row.exo_id,
+        "exercise": row.name,
+        "pr": row.pr,
+        "best": row.best_value,
+        "date": row.best_date.isoformat() if row.best_date else None,
+        "count": row.record_count
+    })
+
+# ?sort=... -> colonne de tri (toujours départagée par l'id)
+ACTIVITY_SORTS = {
+    "start_date": StravaActivity.start_date,
+    "distance": StravaActivity.distance,
+    "elapsed_time": StravaActivity.elapsed_time,
+    "moving_time": StravaActivity.moving_time,
+    "avg_hr": StravaActivity.avg_hr,
+}
 
 @app.route("/activities", methods=["GET"])
 @token_required
+@etag_by_data_version
 def get_activities(current_user):
-    activities = db.session.query(StravaActivity.strava_id).filter_by(user_id=current_user.id).distinct().all()
-    return jsonify([act[0] for act in activities])
+    # Filtres : sport_type, from / to (dates de début, incluses), source ;
+    # tri : sort (voir ACTIVITY_SORTS) et order=asc|desc (desc par défaut)
+    activities = StravaActivity.query.filter(StravaActivity.user_id == current_user.id)
+    sport_type = request.args.get("sport_type")
+    if sport_type:
+        activities = activities.filter(StravaActivity.sport_type == sport_type)
+    source = request.args.get("source")
+    if source:
+        activities = activities.filter(StravaActivity.source == source)
+    try:
+        date_from = parse_pr_date(request.args.get("from"))
+        date_to = parse_pr_date(request.args.get("to"))
+    except ValueError:
+        return jsonify({"message": "Données invalides; dates AAAA-MM-JJ attendues"}), 400
+    if date_from:
+        activities = activities.filter(StravaActivity.start_date >= datetime.datetime.combine(date_from, datetime.time()))
+    if date_to:
+        activities = activities.filter(StravaActivity.start_date < datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time()))
+
+    sort = request.args.get("sort", "start_date")
+    order = request.args.get("order", "desc")
+    if sort not in ACTIVITY_SORTS or order not in ("asc", "desc"):
+        return jsonify({"message": f"Tri invalide; sort parmi {', '.join(ACTIVITY_SORTS)}, order asc ou desc"}), 400
+    return paginated_response(activities, (ACTIVITY_SORTS[sort], StravaActivity.id), StravaActivity.to_dict,
+                              descending=order == "desc")
+
+@app.route("/personal-record/<pr_type>/<int:exo_id>")
+def personal_record_by_id(pr_type, exo_id):
+    # Plusieurs exos peuvent porter le même nom : la page suit l'id
+    exo = db.session.get(Exo, exo_id)
+    return render_template("personal_record.html", pr_type=pr_type, exo_name=exo.name if exo else exo_id, exo_id=exo_id)
 
 @app.route("/personal-record/<pr_type>/<exo_name>")
 def personal_record(pr_type, exo_name):
     return render_template("personal_record.html", pr_type=pr_type, exo_name=exo_name)
 
+def personal_record_to_dict(i):
+    return {
+        "id": i.id,
+        "quantity": i.quantity,
+        "time": i.time,
+        "added_weight": i.added_weight,
+        "date": i.date.isoformat() if i.date else None,
+        "weight": i.weight,
+        "bodyweight": i.bodyweight
+    }
+
+def personal_record_history(user_id, pr_type, exo_ids):
+    # Couvert entièrement par ix_personal_record_user_exo_pr_date, y compris le
+    # tri, pour un seul exo (SQLite traite "IN (?)" comme une égalité)
+    query = Personal_record.query.filter(
+        Personal_record.user_id == user_id, Personal_record.pr == pr_type, Personal_record.exo_id.in_(exo_ids)
+    )
+    return paginated_response(query, (Personal_record.date, Personal_record.id), personal_record_to_dict)
+
+@app.route("/get-personal-record/<pr_type>/<int:exo_id>", methods=["GET"])
+@token_required
+@etag_by_data_version
+def get_personal_record_by_id(current_user, pr_type, exo_id):
+    return personal_record_history(current_user.id, pr_type, [exo_id])
+
 @app.route("/get-personal-record/<pr_type>/<exo_name>", methods=["GET"])
 @token_required
+@etag_by_data_version
 def get_personal_record(current_user, pr_type, exo_name):
-    pr = db.session.query(Personal_record).join(Exo).filter(Personal_record.user_id==current_user.id, Personal_record.pr==pr_type, Exo.name==exo_name).order_by(Personal_record.date.asc()).all()
-    result = []
-
-    for i in pr:
-        result.append({
-            "quantity": i.quantity,
-            "time": i.time,
-            "added_weight": i.added_weight,
-            "date": i.date,
-            "weight": i.weight,
-            "bodyweight": i.bodyweight
+    # Ancienne adresse par nom : tous les exos de ce nom, comme avant les id.
+    # Un nom fait de chiffres est pris par la route par id ci-dessus.
+    # Exo inconnu : liste vide, sous la même forme (paginée ou non) qu'un exo sans PR
+    exo_ids = [exo_id for (exo_id,) in db.session.query(Exo.id).filter_by(name=exo_name)]
+    return personal_record_history(current_user.id, pr_type, exo_ids)
+
+def pr_progression(user_id, windows, today):
+    rows = db.session.query(
+        Personal_record.exo_id, Exo.name, Personal_record.pr, Personal_record.date, Personal_record.quantity,
+        Personal_record.time, Personal_record.added_weight, Personal_record.weight, Personal_record.bodyweight
+    ).join(Personal_record.exo).filter(
+        Personal_record.user_id == user_id, Personal_record.date.isnot(None)
+    ).order_by(Personal_record.exo_id, Personal_record.pr, Personal_record.date, Personal_record.id).all()
+
+    groups = []
+    for (exo_id, pr), group in groupby(rows, key=lambda row: (row.exo_id, row.pr)):
+        group = list(group)
+        groups.append({
+            "exo_id": exo_id,
+            "exercise": group[0].name,
+            "pr": pr,
+            **progression(
+                pr,
+                [row.date for row in group],
+                [row.quantity for row in group],
+                [row.time for row in group],
+                [row.added_weight for row in group],
+                [row.weight for row in group],
+                [row.bodyweight for row in group],
+                today,
+                windows,
+            ),
         })
-    return jsonify(result)        
+    return groups
+
+@app.route("/personal-records/progression", methods=["GET"])
+@token_required
+@etag_by_data_version
+def get_pr_progression(current_user):
+    # Une entrée par (exo, type de PR) ; ?windows=90,365 : fenêtres des tendances (jours)
+    try:
+        windows = tuple(int(w) for w in request.args.get("windows", "").split(",") if w) or DEFAULT_WINDOWS
+    except ValueError:
+        return jsonify({"message": "Paramètre windows invalide"}), 400
+    if any(w <= 0 or w > MAX_WINDOW_DAYS for w in windows):
+        return jsonify({"message": f"Fenêtres entre 1 et {MAX_WINDOW_DAYS} jours"}), 400
+
+    today = datetime.date.today()
+    key = (current_user.id, g.data_version, windows, today)
+    result = pr_progression_cache.get(key)
+    if result is None:
+        result = {"windows": list(windows), "progression": pr_progression(current_user.id, windows, today)}
+        pr_progression_cache.set(key, result)
+    return jsonify(result)
 
 @app.route("/personal-record-add")
 def personal_record_add():
@@ -295,46 +1592,290 @@ def personal_record_add():
 @app.route("/personal-record", methods=["POST"])
 @token_required
 def add_personal_record(current_user):
-    data = request.get_json()
-    if not all(key in data for key in ["exo_id", "pr", "quantity", "time", "added_weight", "date", "weight"]):
-            return jsonify({"message": "Données invalides; champs manquants"}), 400
+    try:
+        values = personal_record_values(request.get_json())
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
-    if data["weight"] != None and data["added_weight"] != None:
-        bodyweight = round((data["weight"]+data["added_weight"])/data["weight"],3)*100
-    else:
-        bodyweight = None
-    print(bodyweight)
-    pr = Personal_record(exo_id=data["exo_id"], user_id=current_user.id, pr=data["pr"],quantity=data["quantity"], time=data["time"], added_weight=data["added_weight"], date=data["date"], weight=data["weight"], bodyweight=bodyweight)
+    pr = Personal_record(user_id=current_user.id, **values)
+    pending = {}
+    merge_pr_best(pending, current_user.id, values)
 
     db.session.add(pr)
+    update_pr_best(current_user.id, pending)
+    bump_data_version(current_user.id)
     db.session.commit()
     return jsonify({"message": "PR ajouté avec succès."}), 201
 
+def iter_import_rows():
+    # Tableau JSON, ou CSV lu au fil de l'envoi (en-tête = noms des champs)
+    if request.mimetype == "text/csv":
+        return csv.DictReader(io.TextIOWrapper(request.stream, encoding="utf-8-sig", newline=""))
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise ValueError("Un tableau JSON ou un fichier CSV est attendu")
+    return data
+
+@app.route("/personal-record/import", methods=["POST"])
+@token_required
+def import_personal_records(current_user):
+    try:
+        rows = iter_import_rows()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    # Une seule requête pour résoudre les noms d'exo. La transaction de lecture
+    # est refermée tout de suite : elle ne reste pas ouverte pendant l'envoi.
+    exo_ids = {name: exo_id for exo_id, name in db.session.query(Exo.id, Exo.name)}
+    known_ids = set(exo_ids.values())
+    db.session.rollback()
+
+    # Tout le fichier est validé avant la moindre écriture : les lignes valides
+    # attendent par lots dans un fichier temporaire (en mémoire tant qu'il est
+    # petit), le verrou d'écriture SQLite n'est pris qu'à la fin de l'envoi
+    errors = []
+    batch = []
+    pending = {}
+    with tempfile.SpooledTemporaryFile(max_size=PR_IMPORT_SPOOL_BYTES) as spool:
+        batches = 0
+        try:
+            for index, row in enumerate(rows, start=1):
+                if isinstance(row, dict) and row.get("exo_id") in (None, "") and "exo" in row:
+                    row = dict(row, exo_id=exo_ids.get(row["exo"]))
+                    if row["exo_id"] is None:
+                        errors.append({"row": index, "message": f"Exo inconnu : {row['exo']}"})
+                        continue
+                try:
+                    values = personal_record_values(row)
+                except ValueError as e:
+                    errors.append({"row": index, "message": str(e)})
+                    continue
+                if values["exo_id"] not in known_ids:
+                    errors.append({"row": index, "message": f"Exo inconnu : {values['exo_id']}"})
+                    continue
+
+                values["user_id"] = current_user.id
+                batch.append(values)
+                merge_pr_best(pending, current_user.id, values)
+                if len(batch) >= PR_IMPORT_BATCH_SIZE:
+                    pickle.dump(batch, spool)
+                    batches += 1
+                    batch = []
+        except (csv.Error, UnicodeDecodeError) as e:
+            return jsonify({"message": f"CSV invalide : {str(e)}"}), 400
+
+        # Une seule transaction courte : insertions groupées (executemany) puis meilleurs PR
+        inserted = len(batch)
+        spool.seek(0)
+        for _ in range(batches):
+            stored = pickle.load(spool)
+            db.session.execute(insert(Personal_record), stored)
+            inserted += len(stored)
+        if batch:
+            db.session.execute(insert(Personal_record), batch)
+    if inserted:
+        update_pr_best(current_user.id, pending)
+        bump_data_version(current_user.id)
+    db.session.commit()
+
+    return jsonify({"inserted": inserted, "errors": errors}), 201 if inserted or not errors else 400
+
 @app.route("/personal-record", methods=["DELETE"])
 @token_required
 def del_personal_record(current_user):
     data = request.get_json()
 
-    Personal_record.query.filter_by(user_id=current_user.id, id=data["id"]).delete()
+    pr = Personal_record.query.filter_by(user_id=current_user.id, id=data["id"]).first()
+    if pr is not None:
+        db.session.delete(pr)
+        db.session.flush()
+        recompute_pr_best(current_user.id, pr.exo_id, pr.pr)
+        bump_data_version(current_user.id)
     db.session.commit()
 
     return jsonify({"message": "PR supprimé avec succès"}), 201
 
+@app.route("/activities/fit", methods=["POST"])
+@token_required
+def upload_fit(current_user):
+    # Le fichier FIT est envoyé tel quel dans le corps de la requête et décodé
+    # au fil de la lecture ; les samples partent par lots dans l'encodeur.
+    encoder = StreamEncoder()
+    start = last = None
+    hr_batch, time_batch = [], []
+    try:
+        for timestamp, hr in iter_hr_records(request.stream):
+            if start is None:
+                start = timestamp
+            elif timestamp < last:
+                continue
+            last = timestamp
+            hr_batch.append(hr)
+            time_batch.append(timestamp - start)
+            if len(hr_batch) >= FIT_BATCH_SIZE:
+                encoder.extend(hr_batch, time_batch)
+                hr_batch, time_batch = [], []
+        encoder.extend(hr_batch, time_batch)
+    except FitError as e:
+        return jsonify({"message": f"Fichier FIT invalide : {str(e)}"}), 400
+
+    if not encoder.count:
+        return jsonify({"message": "Aucune donnée cardio dans le fichier"}), 400
+
+    activity = StravaActivity(user_id=current_user.id, source="fit", start_date=datetime.datetime.utcfromtimestamp(start), elapsed_time=last - start)
+    db.session.add(activity)
+    db.session.flush()
+    data = encoder.finish()
+    db.session.add(HeartRateStream(activity_id=activity.id, sample_count=encoder.count, data=data))
+    # Analyse relue par lots depuis le blob : pas de copie du stream complet
+    settings = get_hr_settings(current_user.id)
+    summary = store_hr_summary(activity.id, *stream_summary(data, settings.zone_bounds, settings.resting_hr, settings.max_hr))
+    if summary:
+        activity.avg_hr = round(summary.avg_hr, 1)
+        activity.max_hr = summary.max_hr
+    if summary and summary.trimp is not None:
+        add_training_load(current_user.id, activity.start_date.date(), summary.trimp)
+    bump_data_version(current_user.id)
+    db.session.commit()
+
+    return jsonify({"message": "Activité importée", "activity_id": activity.id, "samples": encoder.count}), 201
+
 @app.route("/strava/<int:stravaid>")
 def graph_activity(stravaid):
     return render_template("strava_activity.html", stravaid=stravaid)
 
+# (stream, activité, nb de samples, taille du blob, N) -> courbe réduite. La clé
+# suit le contenu : un stream réécrit ou supprimé par un autre process (rebuild,
+# webhook traité par un autre worker) ou un id réutilisé par SQLite donne une
+# autre clé ; le TTL borne le cas d'une réécriture de même taille.
+hr_graph_cache = TTLCache(maxsize=256, ttl=300)
+
+def downsampled_hr(stream_key, points):
+    key = (*stream_key, points)
+    result = hr_graph_cache.get(key)
+    if result is None:
+        stream = db.session.get(HeartRateStream, stream_key[0])
+        hr_values, time_values = downsample_minmax(*stream.arrays(), points)
+        result = {
+            "sample_count": stream.sample_count,
+            "hr": hr_values.tolist(),
+            "time": time_values.tolist()
+        }
+        hr_graph_cache.set(key, result)
+    return result
+
+@app.route("/strava/<int:stravaid>/hr", methods=["GET"])
+@token_required
+def get_activity_hr(current_user, stravaid):
+    points = min(max(request.args.get("points", HR_GRAPH_POINTS, type=int), 10), 5000)
+    # Identité du stream sans lire le blob
+    row = db.session.query(
+        StravaActivity.id, HeartRateStream.id, HeartRateStream.sample_count, db.func.length(HeartRateStream.data)
+    ).outerjoin(HeartRateStream, HeartRateStream.activity_id == StravaActivity.id).filter(
+        StravaActivity.strava_id == stravaid, StravaActivity.user_id == current_user.id
+    ).first()
+    if not row:
+        return jsonify({"message": "Activité introuvable"}), 404
+    activity_id, stream_id, sample_count, size = row
+    if stream_id is None:
+        return jsonify({"message": "Pas de données cardio pour cette activité"}), 404
+
+    result = downsampled_hr((stream_id, activity_id, sample_count, size), points)
+    return jsonify({"strava_id": stravaid, **result})
+
+@app.route("/strava/<int:stravaid>/summary", methods=["GET"])
+@token_required
+def get_activity_summary(current_user, stravaid):
+    summary = db.session.query(HeartRateSummary).join(StravaActivity).filter(
+        StravaActivity.strava_id == stravaid,
+        StravaActivity.user_id == current_user.id
+    ).first()
+    if not summary:
+        return jsonify({"message": "Pas d'analyse cardio pour cette activité"}), 404
+    return jsonify({"strava_id": stravaid, **summary.to_dict()})
+
+@app.route("/hr-zones", methods=["GET"])
+@token_required
+def get_hr_zones(current_user):
+    settings = get_hr_settings(current_user.id)
+    return jsonify({"zones": list(settings.zone_bounds), "resting_hr": settings.resting_hr, "max_hr": settings.max_hr})
+
+def valid_hr(value):
+    return isinstance(value, int) and not isinstance(value, bool) and 30 <= value <= 250
+
+@app.route("/hr-zones", methods=["PUT"])
+@token_required
+def set_hr_zones(current_user):
+    data = request.get_json(silent=True) or {}
+    zones = data.get("zones")
+    resting_hr = data.get("resting_hr")
+    max_hr = data.get("max_hr")
+    if zones is None and resting_hr is None and max_hr is None:
+        return jsonify({"message": "Données invalides; zones, resting_hr ou max_hr attendu"}), 400
+    if zones is not None and (not isinstance(zones, list) or len(zones) != len(DEFAULT_ZONE_BOUNDS)
+            or not all(valid_hr(z) for z in zones)
+            or any(a >= b for a, b in zip(zones, zones[1:]))):
+        return jsonify({"message": "Données invalides; 4 limites croissantes attendues"}), 400
+    if any(v is not None and not valid_hr(v) for v in (resting_hr, max_hr)):
+        return jsonify({"message": "Données invalides; fréquence cardiaque entre 30 et 250 attendue"}), 400
+
+    profile = HeartRateProfile.query.filter_by(user_id=current_user.id).first()
+    if not profile:
+        profile = HeartRateProfile(user_id=current_user.id, zone_bounds=",".join(str(z) for z in DEFAULT_ZONE_BOUNDS))
+        db.session.add(profile)
+    if zones is not None:
+        profile.zone_bounds = ",".join(str(z) for z in zones)
+    if resting_hr is not None:
+        profile.resting_hr = resting_hr
+    if max_hr is not None:
+        profile.max_hr = max_hr
+    if (profile.resting_hr or DEFAULT_RESTING_HR) >= (profile.max_hr or DEFAULT_MAX_HR):
+        db.session.rollback()
+        return jsonify({"message": "Données invalides; FC de repos supérieure à la FC max"}), 400
+    db.session.commit()
+
+    # Les analyses déjà stockées (et la charge d'entraînement) sont recalculées en arrière-plan
+    sync_executor.submit(recompute_hr_summaries, current_user.id)
+    return jsonify({"message": "Réglages enregistrés, recalcul en cours"}), 202
+
+@app.route("/training-load", methods=["GET"])
+@token_required
+@etag_by_data_version
+def get_training_load(current_user):
+    # Série quotidienne TRIMP / charge aiguë (7 j) / chronique (28 j) sur [from, to].
+    # Deux lectures indexées quel que soit l'historique : le dernier jour stocké
+    # avant "from", puis les jours stockés de l'intervalle.
+    try:
+        date_to = parse_pr_date(request.args.get("to")) or datetime.date.today()
+        date_from = parse_pr_date(request.args.get("from")) or date_to - datetime.timedelta(days=TRAINING_LOAD_DEFAULT_DAYS - 1)
+    except ValueError:
+        return jsonify({"message": "Données invalides; dates AAAA-MM-JJ attendues"}), 400
+    if date_from > date_to or (date_to - date_from).days >= TRAINING_LOAD_MAX_DAYS:
+        return jsonify({"message": f"Intervalle invalide (au plus {TRAINING_LOAD_MAX_DAYS} jours)"}), 400
+
+    previous = db.session.query(TrainingLoadDay.day, TrainingLoadDay.atl, TrainingLoadDay.ctl).filter(
+        TrainingLoadDay.user_id == current_user.id, TrainingLoadDay.day < date_from
+    ).order_by(TrainingLoadDay.day.desc()).first()
+    stored = db.session.query(TrainingLoadDay.day, TrainingLoadDay.trimp, TrainingLoadDay.atl, TrainingLoadDay.ctl).filter(
+        TrainingLoadDay.user_id == current_user.id, TrainingLoadDay.day.between(date_from, date_to)
+    ).all()
+    return jsonify(daily_series(previous, stored, date_from, date_to))
+
 @app.route("/strava/login", methods=["GET"])
-def strava_login():
+@token_required
+def strava_login(current_user):
+    # Le navigateur ne peut pas envoyer l'en-tête Authorization en suivant une
+    # redirection : on renvoie l'URL, le client s'y rend lui-même
     params = {
         "client_id": STRAVA_CLIENT_ID,
         "redirect_uri": STRAVA_REDIRECT_URI,
         "response_type": "code",
         "scope": "activity:read_all",
+        "state": strava_oauth_state(current_user.id),
     }
 
-    strava_auth_url = f"https://www.strava.com/oauth/authorize?{urlencode(params)}"
-    return redirect(strava_auth_url)
+    strava_auth_url = f"{STRAVA_OAUTH_URL}/authorize?{urlencode(params)}"
+    return jsonify({"url": strava_auth_url})
 
 @app.route("/strava/callback")
 def strava_callback():
@@ -343,7 +1884,15 @@ def strava_callback():
     if not code:
         return jsonify({"message": "Code manquant"}), 400
 
-    response = requests.post("https://www.strava.com/oauth/token", data={
+    try:
+        state = jwt.decode(request.args.get("state", ""), SECRET_KEY, algorithms=["HS256"])
+        if state.get("purpose") != "strava_oauth":
+            raise jwt.InvalidTokenError
+    except jwt.InvalidTokenError:
+        return jsonify({"message": "State OAuth invalide ou expiré"}), 400
+    user_id = state["user_id"]
+
+    response = request_token({
         "client_id": STRAVA_CLIENT_ID,
         "client_secret": STRAVA_CLIENT_SECRET,
         "code": code,
@@ -355,14 +1904,16 @@ def strava_callback():
 
     tokens = response.json()
 
-    existing_token = StravaToken.query.filter_by(user_id=1).first()
+    existing_token = StravaToken.query.filter_by(user_id=user_id).first()
     if existing_token:
         existing_token.access_token = tokens["access_token"]
         existing_token.refresh_token = tokens["refresh_token"]
         existing_token.expires_at = tokens["expires_at"]
+        existing_token.strava_athlete_id = tokens.get("athlete", {}).get("id") or existing_token.strava_athlete_id
+        strava_token_cache.pop(existing_token.user_id, None)
     else:
         new_token = StravaToken(
-            user_id=1,
+            user_id=user_id,
             access_token=tokens["access_token"],
             refresh_token=tokens["refresh_token"],
             expires_at=tokens["expires_at"],
@@ -374,11 +1925,94 @@ def strava_callback():
 
     return jsonify({"message": "Token Strava enregistré avec succès."})
 
+@app.route("/strava/webhook", methods=["GET"])
+def strava_webhook_challenge():
+    # Validation de l'abonnement : Strava attend son hub.challenge en écho
+    if (request.args.get("hub.mode") != "subscribe" or not STRAVA_WEBHOOK_VERIFY_TOKEN
+            or request.args.get("hub.verify_token") != STRAVA_WEBHOOK_VERIFY_TOKEN):
+        return jsonify({"message": "Jeton de vérification invalide"}), 403
+    return jsonify({"hub.challenge": request.args.get("hub.challenge")})
+
+@app.route("/strava/webhook", methods=["POST"])
+def strava_webhook():
+    # Strava exige une réponse en moins de 2 s : on ne fait qu'enregistrer un
+    # job par événement, le travail (appels API, écritures) se fait en arrière-plan.
+    # Toute réponse autre que 200 est renvoyée plus tard par Strava.
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not all(key in payload for key in ("object_type", "object_id", "aspect_type", "owner_id")):
+        return jsonify({"message": "Événement invalide"}), 400
+    if not STRAVA_WEBHOOK_SUBSCRIPTION_ID or str(payload.get("subscription_id")) != STRAVA_WEBHOOK_SUBSCRIPTION_ID:
+        return jsonify({"message": "Abonnement inconnu"}), 403
+
+    token = StravaToken.query.filter_by(strava_athlete_id=payload["owner_id"]).first()
+    if not token:
+        return jsonify({"message": "Athlète inconnu, événement ignoré"}), 200
+
+    if payload["object_type"] == "athlete":
+        # Révocation de l'accès depuis Strava, vérifiée par le job avant de supprimer le token
+        if str((payload.get("updates") or {}).get("authorized")) == "false":
+            job = enqueue_sync_job(token.user_id, "deauthorize")
+            return jsonify({"job_id": job.id}), 200
+        return jsonify({"message": "Événement ignoré"}), 200
+
+    if payload["object_type"] != "activity" or payload["aspect_type"] not in ("create", "update", "delete"):
+        return jsonify({"message": "Événement ignoré"}), 200
+
+    kind = "delete" if payload["aspect_type"] == "delete" else "activity"
+    job = enqueue_sync_job(token.user_id, kind, payload["object_id"])
+    return jsonify({"job_id": job.id}), 200
+
+@app.cli.command("strava-webhook-replay")
+@click.argument("path")
+@click.option("--wait", is_flag=True, help="Attend la fin des jobs créés")
+def strava_webhook_replay(path, wait):
+    # Rejoue des événements enregistrés (liste JSON) sur /strava/webhook, comme
+    # Strava les enverrait ; voir bench/fixtures/strava_webhook_events.json
+    # (STRAVA_WEBHOOK_SUBSCRIPTION_ID=120475 pour ces événements)
+    with open(path) as f:
+        events = json.load(f)
+    client = app.test_client()
+    job_ids = []
+    for payload in events:
+        start = time.perf_counter()
+        response = client.post("/strava/webhook", json=payload)
+        elapsed = (time.perf_counter() - start) * 1000
+        body = response.get_json() or {}
+        if "job_id" in body:
+            job_ids.append(body["job_id"])
+        print(f"{payload.get('object_type')}/{payload.get('aspect_type')} {payload.get('object_id')} -> "
+              f"{response.status_code} en {elapsed:.1f} ms : {body}")
+
+    if wait and job_ids:
+        sync_executor.shutdown(wait=True)
+        for job in SyncJob.query.filter(SyncJob.id.in_(job_ids)).order_by(SyncJob.id):
+            db.session.refresh(job)
+            print(f"job {job.id} {job.kind} {job.strava_id} : {job.status} ({job.message})")
+
 @app.route("/strava/sync", methods=["GET"])
-def sync_strava():
-    current_user=User.query.get(1)
-    result = fetch_strava_activities(current_user)
-    return jsonify(result)
+@token_required
+def sync_strava(current_user):
+    # La synchro tourne en arrière-plan : on rend la main tout de suite avec l'id du job
+    if not StravaToken.query.filter_by(user_id=current_user.id).first():
+        return jsonify({"message": "Token Strava manquant"}), 400
+    job = enqueue_sync_job(current_user.id)
+    return jsonify({"job_id": job.id, "status": job.status}), 202
+
+@app.route("/strava/sync/<int:job_id>", methods=["GET"])
+@token_required
+def sync_strava_status(current_user, job_id):
+    job = db.session.get(SyncJob, job_id)
+    if not job or job.user_id != current_user.id:
+        return jsonify({"message": "Job introuvable"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/strava/sync-status", methods=["GET"])
+@token_required
+def sync_strava_lag(current_user):
+    status = strava_sync_status(current_user.id)
+    if not status:
+        return jsonify({"message": "Token Strava manquant"}), 404
+    return jsonify(status[0])
 
 if __name__ == "__main__":
     #with app.app_context():
@@ -0,0 +1,248 @@
+# Instrumentation de l'app : latence par route, nombre et temps des requêtes
+# SQL par requête HTTP, appels sortants vers Strava et spans de timing, le tout
+# exposé au format texte Prometheus sur /metrics. Les compteurs sont par
+# process : sous gunicorn chaque worker expose les siens. Les gauges ajoutées
+# par register() sont calculées à chaque scrape (depuis la base pour main.py).
+#
+#   init_app(app)                       # middleware + /metrics + /metrics/queries
+#   with span("strava.sync", user_id=1) as fields:
+#       fields["activities"] = 12       # ajouté à la ligne de log
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Au-delà (ms), la requête est journalisée en WARNING ; 0 désactive
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+SPAN_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+logger = logging.getLogger("sport")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.label_names = labels
+        # labels -> [compteur par bucket (non cumulés), somme, nombre]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Gauge:
+    # Valeur lue au moment du scrape : collect() renvoie {labels: valeur}
+    def __init__(self, name, help, labels, collect):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.collect = collect
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {value}")
+        return lines
+
+
+request_latency = Histogram(
+    "http_request_duration_seconds", "Durée de traitement des requêtes HTTP",
+    LATENCY_BUCKETS, ("route", "method", "status"))
+request_queries = Histogram(
+    "http_request_sql_queries", "Nombre de requêtes SQL par requête HTTP",
+    QUERY_COUNT_BUCKETS, ("route",))
+request_sql_time = Histogram(
+    "http_request_sql_duration_seconds", "Temps passé en SQL par requête HTTP",
+    LATENCY_BUCKETS, ("route",))
+sql_queries = Counter(
+    "sql_queries_total", "Requêtes SQL exécutées (requêtes HTTP et tâches de fond)", ("context",))
+strava_calls = Counter(
+    "strava_requests_total", "Appels HTTP sortants vers Strava", ("endpoint", "status"))
+strava_latency = Histogram(
+    "strava_request_duration_seconds", "Latence des appels vers Strava",
+    LATENCY_BUCKETS, ("endpoint",))
+span_latency = Histogram(
+    "span_duration_seconds", "Durée des spans de timing (synchro, import...)",
+    SPAN_BUCKETS, ("span",))
+
+METRICS = [request_latency, request_queries, request_sql_time, sql_queries,
+           strava_calls, strava_latency, span_latency]
+
+
+def register(metric):
+    METRICS.append(metric)
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+_STRAVA_ID = re.compile(r"/\d+")
+
+
+def observe_strava_call(path, status, seconds):
+    # Les ids sont retirés du chemin pour garder peu de séries
+    endpoint = _STRAVA_ID.sub("/{id}", path.split("?", 1)[0])
+    strava_calls.inc(endpoint=endpoint, status=status)
+    strava_latency.observe(seconds, endpoint=endpoint)
+
+
+@contextmanager
+def span(name, **fields):
+    # Log "span=... duration_ms=... clé=valeur" + histogramme span_duration_seconds
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield fields
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        span_latency.observe(elapsed, span=name)
+        if logger.isEnabledFor(logging.INFO):
+            extra = " ".join(f"{key}={value}" for key, value in fields.items())
+            logger.info(f"span={name} status={status} duration_ms={elapsed * 1000:.1f} {extra}".rstrip())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+    if has_request_context():
+        g.sql_queries = g.get("sql_queries", 0) + 1
+        g.sql_time = g.get("sql_time", 0.0) + elapsed
+        sql_queries.inc(context="request")
+    else:
+        sql_queries.inc(context="background")
+
+
+def _route():
+    # Le motif de la route (/strava/<int:stravaid>/hr) plutôt que l'URL
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+
+def _record_request(response):
+    elapsed = time.perf_counter() - g.get("request_start", time.perf_counter())
+    queries = g.get("sql_queries", 0)
+    sql_time = g.get("sql_time", 0.0)
+    route = _route()
+    request_latency.observe(elapsed, route=route, method=request.method, status=response.status_code)
+    request_queries.observe(queries, route=route)
+    request_sql_time.observe(sql_time, route=route)
+    response.headers["X-Query-Count"] = str(queries)
+
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        logger.warning(
+            f"slow_request method={request.method} path={request.path} status={response.status_code} "
+            f"duration_ms={elapsed * 1000:.1f} sql_queries={queries} sql_ms={sql_time * 1000:.1f}"
+        )
+    return response
+
+
+def metrics_endpoint():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+def query_metrics_endpoint():
+    # Ancienne vue JSON : requêtes SQL par route (total, moyenne)
+    result = {}
+    for (route,), (_, total, count) in request_queries.snapshot().items():
+        result[route] = {"requests": count, "queries": int(total), "avg": round(total / count, 2)}
+    return jsonify(result)
+
+
+def init_app(app):
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule("/metrics", "metrics", metrics_endpoint)
+    app.add_url_rule("/metrics/queries", "query_metrics", query_metrics_endpoint)
@@ -0,0 +1,70 @@
+"""Stockage compact des streams cardio
+
+Revision ID: 3c7e91a4d2b6
+Revises: 0f4252dc23ef
+Create Date: 2025-06-02 18:42:11.307215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from hr_stream import pack_stream, unpack_stream
+
+
+# revision identifiers, used by Alembic.
+revision = '3c7e91a4d2b6'
+down_revision = '0f4252dc23ef'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    heart_rate_stream = op.create_table('heart_rate_stream',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('activity_id', sa.Integer(), nullable=False),
+    sa.Column('sample_count', sa.Integer(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['activity_id'], ['strava_activity.id'], name='fk_heart_rate_stream_activity_id'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('activity_id')
+    )
+
+    # Conversion des samples existants : un blob par activité
+    conn = op.get_bind()
+    activity_ids = [row[0] for row in conn.execute(sa.text(
+        "SELECT DISTINCT activity_id FROM heart_rate_sample"
+    ))]
+    for activity_id in activity_ids:
+        rows = conn.execute(sa.text(
+            "SELECT hr, time FROM heart_rate_sample WHERE activity_id = :id ORDER BY time, id"
+        ), {"id": activity_id}).all()
+        conn.execute(heart_rate_stream.insert().values(
+            activity_id=activity_id,
+            sample_count=len(rows),
+            data=pack_stream([r[0] for r in rows], [r[1] for r in rows])
+        ))
+
+    op.drop_table('heart_rate_sample')
+
+
+def downgrade():
+    heart_rate_sample = op.create_table('heart_rate_sample',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('activity_id', sa.Integer(), nullable=False),
+    sa.Column('hr', sa.Integer(), nullable=False),
+    sa.Column('time', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['activity_id'], ['strava_activity.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    conn = op.get_bind()
+    streams = conn.execute(sa.text("SELECT activity_id, data FROM heart_rate_stream")).all()
+    for activity_id, data in streams:
+        hr, time = unpack_stream(data)
+        if hr:
+            conn.execute(heart_rate_sample.insert(), [
+                {"activity_id": activity_id, "hr": h, "time": t}
+                for h, t in zip(hr, time)
+            ])
+
+    op.drop_table('heart_rate_stream')
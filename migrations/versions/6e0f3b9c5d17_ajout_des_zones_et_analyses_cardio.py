@@ -0,0 +1,66 @@
+"""Ajout des zones et analyses cardio
+
+Revision ID: 6e0f3b9c5d17
+Revises: d4b2e8f17a90
+Create Date: 2025-06-10 21:26:08.419633
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from hr_stream import unpack_stream, hr_summary
+
+
+# revision identifiers, used by Alembic.
+revision = '6e0f3b9c5d17'
+down_revision = 'd4b2e8f17a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('heart_rate_profile',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('zone_bounds', sa.String(length=100), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_heart_rate_profile_user_id'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id')
+    )
+    heart_rate_summary = op.create_table('heart_rate_summary',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('activity_id', sa.Integer(), nullable=False),
+    sa.Column('duration', sa.Integer(), nullable=False),
+    sa.Column('avg_hr', sa.Float(), nullable=False),
+    sa.Column('max_hr', sa.Integer(), nullable=False),
+    sa.Column('hr_drift', sa.Float(), nullable=True),
+    sa.Column('zone1', sa.Integer(), nullable=False),
+    sa.Column('zone2', sa.Integer(), nullable=False),
+    sa.Column('zone3', sa.Integer(), nullable=False),
+    sa.Column('zone4', sa.Integer(), nullable=False),
+    sa.Column('zone5', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['activity_id'], ['strava_activity.id'], name='fk_heart_rate_summary_activity_id'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('activity_id')
+    )
+
+    # Analyse des streams déjà importés avec les zones par défaut
+    conn = op.get_bind()
+    for activity_id, data in conn.execute(sa.text("SELECT activity_id, data FROM heart_rate_stream")).all():
+        result = hr_summary(*unpack_stream(data))
+        if result is None:
+            continue
+        zones = result["time_in_zone"]
+        conn.execute(heart_rate_summary.insert().values(
+            activity_id=activity_id,
+            duration=result["duration"],
+            avg_hr=result["avg_hr"],
+            max_hr=result["max_hr"],
+            hr_drift=result["hr_drift"],
+            zone1=zones[0], zone2=zones[1], zone3=zones[2], zone4=zones[3], zone5=zones[4]
+        ))
+
+
+def downgrade():
+    op.drop_table('heart_rate_summary')
+    op.drop_table('heart_rate_profile')
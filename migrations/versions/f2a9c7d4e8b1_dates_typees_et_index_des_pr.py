@@ -0,0 +1,85 @@
+"""Dates typées et index des PR
+
+Revision ID: f2a9c7d4e8b1
+Revises: c3f8d60a1b45
+Create Date: 2025-06-22 11:05:39.874120
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a9c7d4e8b1'
+down_revision = 'c3f8d60a1b45'
+branch_labels = None
+depends_on = None
+
+
+def _normalize_date(value):
+    if not value:
+        return None
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%Y/%m/%d"):
+        try:
+            return datetime.datetime.strptime(value.strip(), fmt).date().isoformat()
+        except ValueError:
+            pass
+    return None
+
+
+def _normalize_time(value):
+    # "95", "1:35" ou "1:01:35" -> secondes ; le reste est perdu
+    if value in (None, ""):
+        return None
+    try:
+        seconds = 0
+        for part in str(value).strip().split(":"):
+            seconds = seconds * 60 + int(part)
+        return seconds
+    except ValueError:
+        return None
+
+
+def _swap_columns(new_date_type, new_time_type, convert_date, convert_time):
+    # Pas de alter_column avec changement de type : en batch SQLite il fait un
+    # CAST(date AS DATE) qui transforme "2025-04-07" en 2025. On passe donc par
+    # des colonnes temporaires remplies en Python.
+    with op.batch_alter_table('personal_record', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('date_new', new_date_type, nullable=True))
+        batch_op.add_column(sa.Column('time_new', new_time_type, nullable=True))
+
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("SELECT id, date, time FROM personal_record")).all()
+    for pr_id, date, time in rows:
+        conn.execute(
+            sa.text("UPDATE personal_record SET date_new = :date, time_new = :time WHERE id = :id"),
+            {"id": pr_id, "date": convert_date(date), "time": convert_time(time)}
+        )
+
+    with op.batch_alter_table('personal_record', schema=None) as batch_op:
+        batch_op.drop_column('date')
+        batch_op.drop_column('time')
+        batch_op.alter_column('date_new', new_column_name='date')
+        batch_op.alter_column('time_new', new_column_name='time')
+
+
+def upgrade():
+    _swap_columns(sa.Date(), sa.Integer(), _normalize_date, _normalize_time)
+    # Des chaînes vides traînent aussi dans la colonne entière quantity
+    op.execute("UPDATE personal_record SET quantity = NULL WHERE quantity = ''")
+
+    with op.batch_alter_table('personal_record', schema=None) as batch_op:
+        batch_op.create_index('ix_personal_record_user_exo_pr_date', ['user_id', 'exo_id', 'pr', 'date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('personal_record', schema=None) as batch_op:
+        batch_op.drop_index('ix_personal_record_user_exo_pr_date')
+
+    _swap_columns(
+        sa.String(length=100), sa.String(length=100),
+        lambda date: date or "",
+        lambda time: "" if time is None else str(time)
+    )
@@ -0,0 +1,124 @@
+# Pagination par curseur (keyset) et réponses JSON en streaming pour les
+# routes de liste.
+#
+#   GET /route                     -> liste complète (comportement historique)
+#   GET /route?limit=50            -> {"items": [...], "next": "<curseur>"}
+#   GET /route?limit=50&after=...  -> page suivante
+#   GET /route?stream=1            -> tableau JSON envoyé ligne par ligne
+#
+# Tri croissant par défaut ; descending=True parcourt les clés en ordre décroissant.
+import base64
+import datetime
+import json
+
+from flask import Response, jsonify, request, stream_with_context
+from sqlalchemy import and_, false, or_
+
+MAX_LIMIT = 1000
+STREAM_BATCH = 500
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":"), default=_json_default).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, columns):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise ValueError("Curseur invalide")
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("Curseur invalide")
+
+    # Le curseur vient du client : chaque valeur doit avoir le type de sa colonne,
+    # et les dates (en texte) sont retypées pour la comparaison SQL
+    decoded = []
+    for column, value in zip(columns, values):
+        try:
+            decoded.append(_decode_value(_python_type(column), value))
+        except (TypeError, ValueError):
+            raise ValueError("Curseur invalide")
+    return decoded
+
+
+def _python_type(column):
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
+
+
+def _decode_value(python_type, value):
+    if value is None or python_type is None:
+        return value
+    if python_type in (datetime.datetime, datetime.date):
+        if not isinstance(value, str):
+            raise TypeError(value)
+        return python_type.fromisoformat(value)
+    if python_type is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if type(value) is not python_type:
+        raise TypeError(value)
+    return value
+
+
+def keyset_after(columns, values, descending=False):
+    # (c1, c2, ...) après (v1, v2, ...) ; SQLite met NULL en premier en ordre
+    # croissant, donc en dernier en ordre décroissant
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        equal = [c.is_(None) if v is None else c == v for c, v in zip(columns[:i], values[:i])]
+        if descending:
+            if value is None:
+                continue
+            after = or_(column < value, column.is_(None))
+        else:
+            after = column.isnot(None) if value is None else column > value
+        clauses.append(and_(*equal, after))
+    return or_(false(), *clauses)
+
+
+def stream_json(rows, serialize):
+    def generate():
+        yield "["
+        first = True
+        for row in rows:
+            yield ("" if first else ",") + json.dumps(serialize(row), default=_json_default)
+            first = False
+        yield "]"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+def paginated_response(query, key_columns, serialize, descending=False):
+    query = query.order_by(None).order_by(*(column.desc() if descending else column for column in key_columns))
+
+    if request.args.get("stream") in ("1", "true"):
+        return stream_json(query.yield_per(STREAM_BATCH), serialize)
+
+    limit = request.args.get("limit", type=int)
+    if limit is None:
+        return jsonify([serialize(row) for row in query])
+
+    limit = min(max(limit, 1), MAX_LIMIT)
+    after = request.args.get("after")
+    if after:
+        try:
+            query = query.filter(keyset_after(key_columns, decode_cursor(after, key_columns), descending))
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in key_columns])
+    return jsonify({"items": [serialize(row) for row in rows], "next": next_cursor})
@@ -0,0 +1,138 @@
+# Progression d'un type de PR sur un exo, calculée avec numpy sur tout
+# l'historique d'un coup : meilleure valeur cumulée, 1RM estimé (Epley),
+# force relative au poids de corps et tendance linéaire sur des fenêtres de
+# N jours. En interne les dates sont des ordinaux (date.toordinal()) et les
+# valeurs absentes des NaN.
+import datetime
+import re
+
+import numpy as np
+
+DEFAULT_WINDOWS = (90, 365)
+MAX_WINDOW_DAYS = 10 * 366
+# Epley n'est plus fiable au-delà d'une douzaine de répétitions
+MAX_EPLEY_REPS = 12
+
+_REPS = re.compile(r"(\d+)\s*reps?\b")
+
+
+def reps_from_pr(pr):
+    # "1rep max" -> 1, "5reps max" -> 5, "max reps" -> None
+    match = _REPS.search(pr or "")
+    return int(match.group(1)) if match else None
+
+
+def to_array(values):
+    return np.array([np.nan if value is None else float(value) for value in values], dtype=float)
+
+
+def is_reps_pr(pr):
+    # "max reps" mesure des répétitions ; "5reps max" une charge sur 5 répétitions
+    return "rep" in (pr or "") and reps_from_pr(pr) is None
+
+
+def score_keys(pr):
+    # Colonnes comparées pour un type de PR, par priorité
+    if is_reps_pr(pr):
+        return ("quantity", "added_weight", "time")
+    return ("added_weight", "quantity", "time")
+
+
+def pr_score(pr, record):
+    # Valeur comparée pour un PR (dict ou ligne), selon ce que mesure son type.
+    # Un lest nul (au poids du corps) ne compte que s'il n'y a rien d'autre.
+    fallback = None
+    for key in score_keys(pr):
+        value = record[key] if isinstance(record, dict) else getattr(record, key)
+        if value in (None, ""):
+            continue
+        if key == "added_weight" and float(value) == 0:
+            fallback = 0.0
+            continue
+        return float(value)
+    return fallback
+
+
+def scores(pr, quantity, time, added_weight):
+    # Même règle que pr_score, sur des tableaux : colonnes de score_keys, un lest nul
+    # (au poids du corps) n'étant retenu qu'à défaut d'autre chose
+    columns = {"quantity": quantity, "time": time, "added_weight": np.where(added_weight == 0, np.nan, added_weight)}
+    value = np.full(len(quantity), np.nan)
+    for key in reversed(score_keys(pr)):
+        value = np.where(np.isnan(columns[key]), value, columns[key])
+    return np.where(np.isnan(value) & (added_weight == 0), 0.0, value)
+
+
+def epley_1rm(pr, quantity, time, added_weight, weight):
+    # Charge soulevée = poids de corps + lest (comme la colonne bodyweight) ;
+    # répétitions : quantity, sinon celles du nom du PR. Pas d'estimation pour
+    # les PR en durée (isométrie) ni au-delà de MAX_EPLEY_REPS.
+    default_reps = reps_from_pr(pr)
+    reps = np.where(np.isnan(quantity), np.nan if default_reps is None else default_reps, quantity)
+    load = np.where(np.isnan(weight), added_weight, weight + np.nan_to_num(added_weight))
+    e1rm = np.where(reps <= 1, load, load * (1 + reps / 30))
+    return np.where(np.isnan(time) & (reps >= 1) & (reps <= MAX_EPLEY_REPS), e1rm, np.nan)
+
+
+def linear_trend(days, values):
+    # Moindres carrés sur les points connus ; pente ramenée à 30 jours
+    known = ~np.isnan(values)
+    x, y = days[known], values[known]
+    if len(np.unique(x)) < 2:
+        return None
+    slope, intercept = np.polyfit(x, y, 1)
+    total = ((y - y.mean()) ** 2).sum()
+    residual = ((y - (slope * x + intercept)) ** 2).sum()
+    return {
+        "slope_per_30d": round(float(slope * 30), 3),
+        "r2": round(float(1 - residual / total), 3) if total else 1.0,
+        "n": int(len(x)),
+    }
+
+
+def _value(value, digits=3):
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def progression(pr, dates, quantity, time, added_weight, weight, bodyweight, today, windows=DEFAULT_WINDOWS):
+    # Listes alignées, triées par date (None pour une valeur absente) ; les
+    # fenêtres des tendances se terminent à today
+    days = np.array([date.toordinal() for date in dates], dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return _progression(pr, days, to_array(quantity), to_array(time), to_array(added_weight),
+                            to_array(weight), to_array(bodyweight), today.toordinal(), windows)
+
+
+def _progression(pr, days, quantity, time, added_weight, weight, bodyweight, today, windows):
+    value = scores(pr, quantity, time, added_weight)
+    # fmax ignore les NaN : un PR sans valeur ne casse pas la série
+    best = np.fmax.accumulate(value)
+    e1rm = epley_1rm(pr, quantity, time, added_weight, weight)
+    e1rm_best = np.fmax.accumulate(e1rm)
+    relative = bodyweight / 100
+    e1rm_relative = e1rm / weight
+
+    trends = {}
+    for window in windows:
+        in_window = days > today - window
+        trends[str(window)] = {
+            "value": linear_trend(days[in_window], value[in_window]),
+            "e1rm": linear_trend(days[in_window], e1rm[in_window]),
+        }
+
+    last = len(days) - 1
+    return {
+        "count": len(days),
+        "best": _value(best[last]),
+        "e1rm_best": _value(e1rm_best[last]),
+        "relative_best": _value(np.nanmax(relative)) if not np.isnan(relative).all() else None,
+        "trends": trends,
+        "series": [{
+            "date": datetime.date.fromordinal(int(days[i])).isoformat(),
+            "value": _value(value[i]),
+            "best": _value(best[i]),
+            "e1rm": _value(e1rm[i]),
+            "relative": _value(relative[i]),
+            "e1rm_relative": _value(e1rm_relative[i]),
+        } for i in range(len(days))],
+    }
@@ -1,3 +1,52 @@
+// Rafraîchit le JWT avec le refresh token ; une seule requête à la fois, la
+// rotation invalide le refresh token utilisé
+let refreshing = null;
+
+function refreshAccessToken() {
+  if (!refreshing) {
+    const refreshToken = localStorage.getItem("refresh_token");
+    refreshing = (async () => {
+      if (!refreshToken) {
+        return false;
+      }
+      const response = await fetch("/token/refresh", {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json"
+        },
+        body: JSON.stringify({ refresh_token: refreshToken })
+      });
+      if (!response.ok) {
+        // Un autre onglet a pu faire la rotation juste avant
+        return localStorage.getItem("refresh_token") !== refreshToken;
+      }
+      const data = await response.json();
+      localStorage.setItem("token", data.token);
+      localStorage.setItem("refresh_token", data.refresh_token);
+      return true;
+    })().finally(() => {
+      refreshing = null;
+    });
+  }
+  return refreshing;
+}
+
+// fetch avec le JWT courant ; sur 401, un refresh puis un seul nouvel essai
+async function authFetch(url, options = {}) {
+  const send = () => fetch(url, {
+    ...options,
+    headers: {
+      ...(options.headers || {}),
+      Authorization: `Bearer ${localStorage.getItem("token")}`
+    }
+  });
+  let response = await send();
+  if (response.status === 401 && await refreshAccessToken()) {
+    response = await send();
+  }
+  return response;
+}
+
 document.addEventListener("DOMContentLoaded", async () => {
     const form_login = document.getElementById("loginForm");
 
@@ -20,6 +69,7 @@ document.addEventListener("DOMContentLoaded", async () => {
   
         if (response.ok) {
           localStorage.setItem("token", data.token);
+          localStorage.setItem("refresh_token", data.refresh_token);
           window.location.href = "/personal-index";
         }
       });
@@ -60,7 +110,8 @@ document.addEventListener("DOMContentLoaded", async () => {
         const exo_id = parseInt(document.getElementById("exo_id").value);
         const pr = document.getElementById("pr").value;
         const quantity = parseInt(document.getElementById("quantity").value);
-        const time = parseInt(document.getElementById("time").value);
+        // Envoyé tel quel ("1:35") : le serveur le convertit en secondes
+        const time = document.getElementById("time").value;
         const date = document.getElementById("date").value;
         const added_weight = parseInt(document.getElementById("added_weight").value);
         const weight = parseInt(document.getElementById("weight").value);
@@ -70,11 +121,10 @@ document.addEventListener("DOMContentLoaded", async () => {
         return;
         }
 
-        const response = await fetch("/personal-record", {
+        const response = await authFetch("/personal-record", {
           method: "POST",
           headers: {
-            "Content-Type": "application/json",
-            "Authorization": `Bearer ${token}`
+            "Content-Type": "application/json"
           },
           body: JSON.stringify({ exo_id, pr, quantity, time, date, added_weight, weight })
         });
@@ -108,35 +158,29 @@ document.addEventListener("DOMContentLoaded", async () => {
         return;
       }
 
-      fetch("/pr-types", {
-        headers: {
-          Authorization: `Bearer ${token}`
-        }
-      })
+      authFetch("/pr-types")
         .then(res => res.json())
         .then(prTypes => {
           const select = document.getElementById("prSelect");
           prTypes.forEach(pr => {
             const option = document.createElement("option");
-            option.value = `${pr.pr}:${pr.exercise}`;
+            // Par id : deux exos peuvent avoir le même nom
+            option.value = JSON.stringify([pr.pr, pr.exo_id]);
             option.textContent = `${pr.exercise} - ${pr.pr}`;
             select.appendChild(option);
           });
         });
 
-      fetch("/activities", {
-        headers: {
-          Authorization: `Bearer ${token}`
-        }
-      })
+      authFetch("/activities")
         .then(res => res.json())
         .then(activity => {
           const selectActivity = document.getElementById("prSelectActivity")
-          activity.forEach(ac => {
+          activity.filter(ac => ac.strava_id).forEach(ac => {
             const optionActivity = document.createElement("option");
-            option.value = ac;
-            option.textContent = ac;
-            selectActivity.appendChild(option);
+            optionActivity.value = ac.strava_id;
+            const date = ac.start_date ? ac.start_date.slice(0, 10) : "";
+            optionActivity.textContent = [date, ac.sport_type, ac.name].filter(Boolean).join(" - ") || ac.strava_id;
+            selectActivity.appendChild(optionActivity);
           });
         });
 
@@ -144,8 +188,8 @@ document.addEventListener("DOMContentLoaded", async () => {
       document.getElementById("prSelect").addEventListener("change", (e) => {
         const selectedPr = e.target.value;
         if (selectedPr) {
-          const [pr, exo] = selectedPr.split(":");
-          window.location.href = `/personal-record/${encodeURIComponent(pr)}/${encodeURIComponent(exo)}`;
+          const [pr, exoId] = JSON.parse(selectedPr);
+          window.location.href = `/personal-record/${encodeURIComponent(pr)}/${exoId}`;
         }
       });
       document.getElementById("prSelectActivity").addEventListener("change", (f) => {
@@ -163,6 +207,7 @@ document.addEventListener("DOMContentLoaded", async () => {
       const body = document.querySelector('body');
       const prType = body.getAttribute('data-pr-type');
       const exoName = body.getAttribute('data-exo-name');
+      const exoId = body.getAttribute('data-exo-id');
       const token = localStorage.getItem("token");
   
       if (!token) {
@@ -171,11 +216,8 @@ document.addEventListener("DOMContentLoaded", async () => {
       }
   
       try {
-        const response = await fetch(`/get-personal-record/${prType}/${exoName}`, {
-          headers: {
-            Authorization: `Bearer ${token}`
-          }
-        });
+        const exo = exoId || encodeURIComponent(exoName);
+        const response = await authFetch(`/get-personal-record/${encodeURIComponent(prType)}/${exo}`);
   
         const data = await response.json();
   
@@ -240,5 +282,58 @@ document.addEventListener("DOMContentLoaded", async () => {
         document.body.innerHTML = "<p>Erreur lors du chargement des PR.</p>";
       }
     }
+
+    if (/^\/strava\/\d+$/.test(window.location.pathname)) {
+      const stravaId = document.querySelector('body').getAttribute('data-strava-id');
+      const token = localStorage.getItem("token");
+
+      if (!token) {
+        document.body.innerHTML = "<p>Veuillez vous connecter.</p>";
+        return;
+      }
+
+      // Le serveur renvoie un stream déjà réduit (~800 points)
+      const response = await authFetch(`/strava/${stravaId}/hr?points=800`);
+      const data = await response.json();
+
+      if (!response.ok) {
+        document.body.innerHTML = `<p>${data.message}</p>`;
+        return;
+      }
+
+      const ctx = document.getElementById("hrChart").getContext("2d");
+      new Chart(ctx, {
+        type: "line",
+        data: {
+          labels: data.time,
+          datasets: [{
+            label: "Fréquence cardiaque",
+            data: data.hr,
+            borderColor: "rgba(255, 99, 132, 1)",
+            pointRadius: 0,
+            borderWidth: 1
+          }]
+        },
+        options: {
+          responsive: true,
+          animation: false,
+          scales: {
+            x: {
+              title: {
+                display: true,
+                text: "Temps (s)"
+              }
+            },
+            y: {
+              title: {
+                display: true,
+                text: "bpm"
+              },
+              beginAtZero: false
+            }
+          }
+        }
+      });
+    }
   });
   
\ No newline at end of file
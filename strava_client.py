@@ -0,0 +1,268 @@
+# Client HTTP Strava partagé : session poolée, téléchargements concurrents,
+# respect des quotas (X-RateLimit-*) et retry avec backoff sur 429/5xx. Les
+# streams passent par le cache disque (stream_cache.py) quand il est fourni.
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import observe_strava_call
+
+# Surchargeable pour pointer vers un faux serveur Strava en local (bench/stub_strava.py)
+STRAVA_BASE_URL = os.getenv("STRAVA_BASE_URL", "https://www.strava.com").rstrip("/")
+STRAVA_API_URL = f"{STRAVA_BASE_URL}/api/v3"
+STRAVA_OAUTH_URL = f"{STRAVA_BASE_URL}/oauth"
+
+MAX_WORKERS = int(os.getenv("STRAVA_MAX_WORKERS", "8"))
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# Quotas de lecture de l'app (15 min, jour) tant qu'aucune réponse Strava ne les a donnés
+DEFAULT_RATE_LIMIT = tuple(int(v) for v in os.getenv("STRAVA_RATE_LIMIT", "100,1000").split(",")[:2])
+
+
+class StravaError(Exception):
+    pass
+
+
+class RateLimitExceeded(StravaError):
+    pass
+
+
+class BudgetExhausted(StravaError):
+    pass
+
+
+class RateLimiter:
+    # Strava renvoie "limite_15min,limite_jour" et "usage_15min,usage_jour".
+    # On garde une marge pour ne jamais recevoir de 429 en rafale.
+    WINDOW = 15 * 60
+    DAY = 24 * 3600
+
+    def __init__(self, reserve=0.05):
+        self.reserve = reserve
+        self.limit = None
+        self.usage = None
+        self.updated_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _parse(value):
+        try:
+            short, daily = value.split(",")[:2]
+            return int(short), int(daily)
+        except (AttributeError, ValueError):
+            return None
+
+    def update(self, headers):
+        limit = self._parse(headers.get("X-RateLimit-Limit"))
+        usage = self._parse(headers.get("X-RateLimit-Usage"))
+        if limit and usage:
+            with self._lock:
+                self.limit = limit
+                self.usage = usage
+                self.updated_at = time.time()
+
+    def _headroom(self, limit, usage):
+        return limit - usage - int(limit * self.reserve)
+
+    def seconds_until_reset(self):
+        return self.WINDOW - time.time() % self.WINDOW
+
+    def seconds_until_daily_reset(self):
+        # Le quota journalier repart à minuit UTC
+        return self.DAY - time.time() % self.DAY
+
+    def _current_usage(self, now):
+        # À appeler sous le verrou : un usage relevé dans une fenêtre (ou un
+        # jour) déjà écoulé(e) ne compte plus
+        usage = self.usage or (0, 0)
+        if self.updated_at is not None:
+            if now // self.DAY != self.updated_at // self.DAY:
+                usage = (0, 0)
+            elif now // self.WINDOW != self.updated_at // self.WINDOW:
+                usage = (0, usage[1])
+        return usage
+
+    def headroom(self):
+        # Requêtes encore disponibles (15 min, jour)
+        with self._lock:
+            limit = self.limit or DEFAULT_RATE_LIMIT
+            usage = self._current_usage(time.time())
+            return max(0, self._headroom(limit[0], usage[0])), max(0, self._headroom(limit[1], usage[1]))
+
+    def acquire(self):
+        # Bloque jusqu'à la prochaine fenêtre de 15 min si le quota est épuisé
+        with self._lock:
+            if not self.limit:
+                return
+            now = time.time()
+            self.usage, self.updated_at = self._current_usage(now), now
+            if self._headroom(self.limit[1], self.usage[1]) <= 0:
+                raise RateLimitExceeded("Quota journalier Strava épuisé")
+            if self._headroom(self.limit[0], self.usage[0]) > 0:
+                self.usage = (self.usage[0] + 1, self.usage[1] + 1)
+                return
+            wait = self.seconds_until_reset()
+        time.sleep(wait)
+        with self._lock:
+            now = time.time()
+            usage = self._current_usage(now)
+            self.usage, self.updated_at = (usage[0] + 1, usage[1] + 1), now
+
+
+class RequestBudget:
+    # Plafond de requêtes pour une synchro, par-dessus le quota partagé de l'app.
+    # Se passe comme limiter à StravaClient ; cap=None ne fait que compter.
+    def __init__(self, cap=None, limiter=None):
+        self.cap = cap
+        self.used = 0
+        self.limiter = limiter or rate_limiter
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        return self.limiter.limit
+
+    @property
+    def usage(self):
+        return self.limiter.usage
+
+    def update(self, headers):
+        self.limiter.update(headers)
+
+    def seconds_until_reset(self):
+        return self.limiter.seconds_until_reset()
+
+    def acquire(self):
+        with self._lock:
+            if self.cap is not None and self.used >= self.cap:
+                raise BudgetExhausted("Budget de requêtes Strava atteint")
+            self.used += 1
+        self.limiter.acquire()
+
+
+# Partagés par tous les appels du process : un seul pool de connexions et un seul quota
+_session = None
+_session_lock = threading.Lock()
+rate_limiter = RateLimiter()
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def request_token(data, timeout=30):
+    # Échange OAuth (code ou refresh_token) contre un access token
+    start = time.perf_counter()
+    try:
+        response = get_session().post(f"{STRAVA_OAUTH_URL}/token", data=data, timeout=timeout)
+    except requests.RequestException:
+        observe_strava_call("/oauth/token", "error", time.perf_counter() - start)
+        raise
+    observe_strava_call("/oauth/token", response.status_code, time.perf_counter() - start)
+    return response
+
+
+class StravaClient:
+    def __init__(self, access_token, max_workers=MAX_WORKERS, max_retries=4, backoff=0.5,
+                 session=None, limiter=None, timeout=30, cache=None):
+        self.headers = {"Authorization": f"Bearer {access_token}"}
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = session or get_session()
+        self.limiter = limiter or rate_limiter
+        self.timeout = timeout
+        # StreamCache (stream_cache.py) lu avant tout téléchargement de stream
+        self.cache = cache
+
+    def _retry_delay(self, attempt, response):
+        if response is not None and response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return int(retry_after)
+            if self.limiter.limit and self.limiter.usage[0] >= self.limiter.limit[0]:
+                return self.limiter.seconds_until_reset()
+        return self.backoff * 2 ** attempt * (1 + random.random() / 2)
+
+    def get(self, path, params=None):
+        url = path if path.startswith("http") else f"{STRAVA_API_URL}{path}"
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            response = None
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=self.headers, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                observe_strava_call(path, "error", time.perf_counter() - start)
+                if attempt == self.max_retries:
+                    raise
+            else:
+                observe_strava_call(path, response.status_code, time.perf_counter() - start)
+                self.limiter.update(response.headers)
+                if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                    return response
+            time.sleep(self._retry_delay(attempt, response))
+        return response
+
+    def _cached_stream(self, activity_id, keys):
+        return self.cache.get(activity_id, keys) if self.cache else None
+
+    def _download_stream(self, activity_id, keys):
+        response = self.get(f"/activities/{activity_id}/streams", {"keys": keys, "key_by_type": "true"})
+        if response.status_code != 200:
+            return None
+        if self.cache:
+            try:
+                self.cache.put(activity_id, keys, response.content)
+            except OSError:
+                pass  # disque plein ou en lecture seule : le cache est facultatif
+        return response.json()
+
+    def fetch_stream(self, activity_id, keys="heart_rate,time"):
+        stream = self._cached_stream(activity_id, keys)
+        if stream is None:
+            stream = self._download_stream(activity_id, keys)
+        return stream
+
+    def fetch_streams(self, activity_ids, keys="heart_rate,time"):
+        # Génère (activity_id, stream ou None) au fil des téléchargements ;
+        # les écritures en base restent dans le thread appelant.
+        missing = []
+        for activity_id in activity_ids:
+            stream = self._cached_stream(activity_id, keys)
+            if stream is None:
+                missing.append(activity_id)
+            else:
+                yield activity_id, stream
+        if not missing:
+            return
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {pool.submit(self._download_stream, activity_id, keys): activity_id for activity_id in missing}
+            exhausted = None
+            for future in as_completed(futures):
+                activity_id = futures[future]
+                try:
+                    yield activity_id, future.result()
+                except requests.RequestException:
+                    yield activity_id, None
+                except BudgetExhausted as e:
+                    # Les streams déjà téléchargés sont rendus avant d'arrêter
+                    exhausted = e
+            if exhausted:
+                raise exhausted
+        finally:
+            # Quota épuisé ou consommateur arrêté : on n'envoie pas les requêtes restantes
+            pool.shutdown(wait=True, cancel_futures=True)
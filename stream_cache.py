@@ -0,0 +1,114 @@
+# Cache disque des réponses brutes de /activities/{id}/streams : un stream ne
+# change plus une fois l'activité envoyée, les resynchros et retraitements le
+# relisent ici au lieu de le retélécharger. Une entrée par (strava_id, keys),
+# nommée par le hash de la clé et compressée ; au-delà de max_bytes, les
+# entrées les moins récemment lues (mtime) sont supprimées.
+#
+#   cache = StreamCache("instance/stream_cache", max_bytes=512 * 2**20)
+#   cache.put(123, "heart_rate,time", response.content)
+#   cache.get(123, "heart_rate,time")   # -> dict ou None
+#   cache.delete(123, "heart_rate,time")  # activité supprimée, accès révoqué
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zlib
+
+SUFFIX = ".json.z"
+
+
+class StreamCache:
+    def __init__(self, directory, max_bytes, evict_to=0.9):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Après un dépassement, on descend sous cette fraction pour ne pas évincer à chaque écriture
+        self.evict_to = evict_to
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _path(self, strava_id, keys):
+        digest = hashlib.sha256(f"{strava_id}:{keys}".encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + SUFFIX)
+
+    def get(self, strava_id, keys):
+        path = self._path(strava_id, keys)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # dernière lecture, pour l'éviction LRU
+            return json.loads(zlib.decompress(data))
+        except FileNotFoundError:
+            return None
+        except (zlib.error, ValueError):
+            # Entrée tronquée ou corrompue : on la retélécharge
+            self._remove(path)
+            return None
+
+    def put(self, strava_id, keys, content):
+        # content : corps brut (bytes) d'une réponse 200
+        path = self._path(strava_id, keys)
+        data = zlib.compress(content, 6)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Écriture atomique : un lecteur concurrent voit l'ancienne entrée ou la nouvelle
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def delete(self, strava_id, keys):
+        # Les données d'une activité supprimée ne restent pas sur disque jusqu'à l'éviction
+        path = self._path(strava_id, keys)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return False
+        self._remove(path)
+        with self._lock:
+            if self._size is not None:
+                self._size = max(0, self._size - size)
+        return True
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(SUFFIX):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        # Relit le répertoire : les autres process écrivent aussi dans le cache
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * self.evict_to
+        for _, size, path in entries:
+            if total <= target:
+                break
+            self._remove(path)
+            total -= size
+        self._size = total
+
+    def stats(self):
+        entries = list(self._entries())
+        return {"entries": len(entries), "bytes": sum(size for _, size, _ in entries), "max_bytes": self.max_bytes}
@@ -0,0 +1,63 @@
+# Quota et retry du client Strava, contre le faux serveur de bench/stub_strava.py
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bench"))
+
+from strava_client import RateLimiter, RateLimitExceeded, StravaClient
+from stub_strava import start_stub
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    def fail(seconds):
+        raise AssertionError(f"sleep({seconds}) inattendu")
+    monkeypatch.setattr(time, "sleep", fail)
+
+
+def limiter_with(usage, updated_at, limit=(100, 1000)):
+    limiter = RateLimiter()
+    limiter.limit, limiter.usage, limiter.updated_at = limit, usage, updated_at
+    return limiter
+
+
+def test_daily_quota_exhausted_raises(no_sleep):
+    limiter = limiter_with((0, 960), time.time())
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire()
+
+
+def test_daily_usage_resets_on_next_day(no_sleep):
+    limiter = limiter_with((0, 960), time.time() - 2 * RateLimiter.DAY)
+    assert limiter.headroom() == (95, 950)
+    limiter.acquire()
+    assert limiter.usage == (1, 1)
+
+
+def test_window_usage_resets_without_sleeping(no_sleep):
+    now = time.time()
+    limiter = limiter_with((99, 500), now - now % RateLimiter.WINDOW - 1)
+    if now // RateLimiter.DAY != (now - now % RateLimiter.WINDOW - 1) // RateLimiter.DAY:
+        pytest.skip("fenêtre précédente la veille")
+    limiter.acquire()
+    assert limiter.usage == (1, 501)
+
+
+def test_retries_server_errors_and_reads_rate_headers():
+    server, base_url = start_stub(activities=5, error_rate=0.5)
+    try:
+        limiter = RateLimiter()
+        client = StravaClient("test", max_retries=20, backoff=0, limiter=limiter)
+        for _ in range(5):
+            response = client.get(f"{base_url}/api/v3/athlete/activities")
+            assert response.status_code == 200
+        # Au moins une 503 avec ce taux d'erreur et la graine du stub
+        assert server.state.calls["activities"] > 5
+        assert limiter.limit == (600, 30000)
+        assert limiter.usage == tuple(server.state.usage)
+    finally:
+        server.shutdown()
@@ -0,0 +1,29 @@
+# Cache disque des streams Strava
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from stream_cache import StreamCache
+
+KEYS = "heart_rate,time"
+STREAM = {"heart_rate": {"data": [120, 121, 125]}, "time": {"data": [0, 1, 2]}}
+
+
+def test_delete_removes_entry(tmp_path):
+    cache = StreamCache(str(tmp_path), max_bytes=2**20)
+    cache.put(1, KEYS, json.dumps(STREAM).encode())
+    cache.put(2, KEYS, json.dumps(STREAM).encode())
+    assert cache.get(1, KEYS) == STREAM
+
+    assert cache.delete(1, KEYS)
+    assert cache.get(1, KEYS) is None
+    assert cache.get(2, KEYS) == STREAM
+    assert cache.stats()["entries"] == 1
+    assert cache._size == cache.stats()["bytes"]
+
+
+def test_delete_missing_entry(tmp_path):
+    cache = StreamCache(str(tmp_path), max_bytes=2**20)
+    assert not cache.delete(1, KEYS)
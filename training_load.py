@@ -0,0 +1,66 @@
+# Charge d'entraînement quotidienne : la TRIMP du jour alimente deux moyennes
+# exponentielles, aiguë (7 jours, "fatigue") et chronique (28 jours, "forme").
+# Seuls les jours avec activité sont stockés ; entre deux, la charge décroît
+# simplement de decay^jours, ce qui permet de reconstituer n'importe quel jour
+# à partir du dernier jour stocké avant lui.
+import datetime
+import math
+
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+ACUTE_DECAY = math.exp(-1 / ACUTE_DAYS)
+CHRONIC_DECAY = math.exp(-1 / CHRONIC_DAYS)
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def advance(atl, ctl, days, load=0.0):
+    # État à la fin d'un jour situé `days` jours (>= 1) après l'état connu
+    atl = atl * ACUTE_DECAY ** days + load * (1 - ACUTE_DECAY)
+    ctl = ctl * CHRONIC_DECAY ** days + load * (1 - CHRONIC_DECAY)
+    return atl, ctl
+
+
+def chain(previous, days):
+    # previous : (jour, atl, ctl) ou None ; days : [(jour, trimp)] triés.
+    # Renvoie [(jour, trimp, atl, ctl)] en enchaînant depuis previous.
+    if previous is None:
+        day0, atl, ctl = None, 0.0, 0.0
+    else:
+        day0, atl, ctl = previous
+    result = []
+    for day, load in days:
+        gap = (day - day0).days if day0 is not None else 1
+        atl, ctl = advance(atl, ctl, gap, load)
+        result.append((day, load, atl, ctl))
+        day0 = day
+    return result
+
+
+def daily_series(previous, stored, date_from, date_to):
+    # Série jour par jour entre date_from et date_to (inclus) à partir du
+    # dernier jour stocké avant date_from et des jours stockés dans l'intervalle
+    stored = {day: (load, atl, ctl) for day, load, atl, ctl in stored}
+    if previous is None:
+        day0, atl, ctl = None, 0.0, 0.0
+    else:
+        day0, atl, ctl = previous
+
+    series = []
+    day = date_from
+    while day <= date_to:
+        load = 0.0
+        if day in stored:
+            load, atl, ctl = stored[day]
+        elif day0 is not None:
+            atl, ctl = advance(atl, ctl, (day - day0).days)
+        if day in stored or day0 is not None:
+            day0 = day
+        series.append({
+            "date": day.isoformat(),
+            "trimp": round(load, 1),
+            "atl": round(atl, 1),
+            "ctl": round(ctl, 1),
+            "ratio": round(atl / ctl, 2) if ctl > 0 else None,
+        })
+        day += ONE_DAY
+    return series